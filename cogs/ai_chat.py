@@ -1,16 +1,239 @@
 
 import discord
 from discord.ext import commands
-from typing import Optional, List, Dict
+from typing import Optional, List, Dict, Tuple, AsyncIterator
 import logging
 import aiohttp
-import json
+import orjson
 import os
+import re
+import ssl
 import asyncio
+import math
+import time
+from collections import defaultdict, deque
 from datetime import datetime
 
 logger = logging.getLogger(__name__)
 
+# Patterns that indicate need for real-time/web information (compiled once into one alternation)
+WEB_PATTERNS = [
+    # Weather
+    r"weather\s+(in|at|for|today|tomorrow|this week)",
+    r"(what's|whats|what is)\s+the\s+weather",
+    r"is it (raining|snowing|sunny|cold|hot)",
+    # News/Current events
+    r"(latest|recent|current|today's|breaking)\s+(news|updates|headlines)",
+    r"what('s| is) happening (in|with|at)",
+    r"news (about|on|regarding)",
+    # Sports/Scores
+    r"(score|result|who won|did .+ win)",
+    r"(game|match|fight)\s+(today|yesterday|last night)",
+    # Stock/Crypto prices
+    r"(price|stock|crypto|bitcoin|eth)\s+(of|for|today|now)",
+    r"how much is .+ (worth|trading|today)",
+    # Time-sensitive info
+    r"(current|right now|today|this week|this month)",
+    r"(when|what time) (is|does|will)",
+    r"hours (of|for)",
+    r"(open|closed|operating)\s+hours",
+    # Search/lookup
+    r"(search|google|look up|find)\s+(for|about)?",
+    r"who is .+ (dating|married|president|ceo)",
+    r"how (old|tall|much) is",
+    # Facts that may change
+    r"(population|capital|president|ceo|leader) of",
+]
+WEB_PATTERN_RE = re.compile("|".join(f"(?:{pattern})" for pattern in WEB_PATTERNS))
+
+# Keywords that strongly suggest web search (matched against whole words)
+WEB_KEYWORDS = frozenset([
+    'weather', 'forecast', 'news', 'headlines', 'score', 'results',
+    'stock', 'stocks', 'crypto', 'bitcoin', 'price', 'prices',
+    'latest', 'recent', 'current', 'today', 'yesterday', 'tonight',
+    'breaking', 'update', 'updates', 'live', 'real-time', 'realtime',
+    'search', 'google', 'lookup',
+    'election', 'vote', 'poll', 'market', 'nasdaq', 'dow',
+])
+WEB_PHRASE_RE = re.compile(r"find out|what happened")
+WORD_RE = re.compile(r"[\w'-]+")
+
+# Prompt file text keyed by path -> (mtime, text), reused across cog reloads
+PROMPT_FILE_CACHE: Dict[str, Tuple[float, str]] = {}
+
+# User mention syntax (<@id> or <@!id>)
+MENTION_RE = re.compile(r"<@!?\d+>")
+
+# Casual phrases that shouldn't trigger a web search on their own
+CASUAL_RE = re.compile("|".join(re.escape(phrase) for phrase in [
+    "how's your day", "what's up", "how are you",
+    "good morning", "good night", "today i",
+    "my day", "your day"
+]))
+
+def chunk_message(text: str, limit: int = 1990) -> List[str]:
+    """Split text into Discord-sized chunks in one pass, preferring line boundaries"""
+    chunks = []
+    buf = []
+    size = 0
+    for line in text.split("\n"):
+        # Hard-split lines that can't fit in a single chunk
+        while len(line) > limit:
+            if buf:
+                chunks.append("\n".join(buf))
+                buf, size = [], 0
+            chunks.append(line[:limit])
+            line = line[limit:]
+        if buf and size + 1 + len(line) > limit:
+            chunks.append("\n".join(buf))
+            buf, size = [], 0
+        size += len(line) + (1 if buf else 0)
+        buf.append(line)
+    if buf:
+        chunks.append("\n".join(buf))
+    return [chunk for chunk in chunks if chunk.strip()]
+
+# Roles accepted in uploaded history files
+VALID_ROLES = frozenset({'user', 'assistant', 'system'})
+
+def parse_history(content: bytes) -> List[Dict[str, str]]:
+    """Parse an uploaded history JSON file into chat messages"""
+    data = orjson.loads(content)
+
+    # Validate format (list of dicts with role/content)
+    if not isinstance(data, list):
+        raise ValueError("Root element must be a list")
+
+    # Skip invalid items and default unknown roles to user
+    return [
+        {"role": role if role in VALID_ROLES else 'user', "content": str(item['content'])}
+        for item in data
+        if isinstance(item, dict) and 'role' in item and 'content' in item
+        for role in (item['role'].lower(),)
+    ]
+
+class ResponseCache:
+    """Small semantic cache mapping similar prompts (in the same preceding context) to previous replies"""
+
+    # Preceding turns folded into the context key, so follow-ups like "why?" only match within one conversation
+    CONTEXT_TURNS = 4
+
+    def __init__(self, threshold: float = 0.92, ttl: float = 3600, max_entries: int = 512):
+        self.threshold = threshold
+        self.ttl = ttl
+        # FIFO of (context_key, embedding, reply, created_at)
+        self.entries = deque(maxlen=max_entries)
+
+    @staticmethod
+    def embed(text: str) -> Dict[str, float]:
+        """Cheap bag-of-words embedding (unigrams + bigrams), L2-normalized"""
+        words = text.lower().split()
+        vector: Dict[str, float] = {}
+        for token in words + [f"{a} {b}" for a, b in zip(words, words[1:])]:
+            vector[token] = vector.get(token, 0.0) + 1.0
+        norm = math.sqrt(sum(v * v for v in vector.values()))
+        if norm:
+            for token in vector:
+                vector[token] /= norm
+        return vector
+
+    @staticmethod
+    def similarity(a: Dict[str, float], b: Dict[str, float]) -> float:
+        """Cosine similarity of two normalized sparse vectors"""
+        if len(a) > len(b):
+            a, b = b, a
+        return sum(v * b.get(token, 0.0) for token, v in a.items())
+
+    @classmethod
+    def context_key(cls, conversation_history: List[Dict[str, str]]) -> int:
+        """Hash of the turns preceding the latest message"""
+        return hash(tuple(
+            (message["role"], message["content"])
+            for message in conversation_history[-cls.CONTEXT_TURNS - 1:-1]
+        ))
+
+    def get(self, text: str, context: int = 0) -> Optional[str]:
+        """Return a cached reply for a sufficiently similar prompt in the same context, if any"""
+        embedding = self.embed(text)
+        if not embedding:
+            return None
+        now = time.monotonic()
+        while self.entries and now - self.entries[0][3] > self.ttl:
+            self.entries.popleft()  # Expired
+        best_score, best_reply = 0.0, None
+        for cached_context, cached_embedding, reply, _ in self.entries:
+            if cached_context != context:
+                continue
+            score = self.similarity(embedding, cached_embedding)
+            if score > best_score:
+                best_score, best_reply = score, reply
+        return best_reply if best_score >= self.threshold else None
+
+    def put(self, text: str, reply: str, context: int = 0):
+        """Store a reply for a prompt in the given context"""
+        embedding = self.embed(text)
+        if embedding:
+            self.entries.append((context, embedding, reply, time.monotonic()))
+
+    def clear(self):
+        """Drop all cached replies"""
+        self.entries.clear()
+
+class CircuitBreaker:
+    """Three-state circuit breaker (CLOSED -> OPEN -> HALF_OPEN) with exponential backoff"""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, initial_backoff: float = 300, max_backoff: float = 3600, probe_timeout: float = 60):
+        self.initial_backoff = initial_backoff
+        self.max_backoff = max_backoff
+        # A probe that never reports back (e.g. network error) is retried after this long
+        self.probe_timeout = probe_timeout
+        self.state = self.CLOSED
+        self.backoff = initial_backoff
+        self.opened_at = 0.0
+        self.probe_started = 0.0
+
+    @property
+    def is_closed(self) -> bool:
+        """Whether requests are flowing normally"""
+        return self.state == self.CLOSED
+
+    def allow(self) -> bool:
+        """Check whether a request may be sent (lets one probe through once the backoff elapses)"""
+        if self.state == self.CLOSED:
+            return True
+
+        now = time.monotonic()
+        if self.state == self.OPEN:
+            if now - self.opened_at < self.backoff:
+                return False
+        elif now - self.probe_started < self.probe_timeout:
+            return False  # Probe already in flight
+
+        self.state = self.HALF_OPEN
+        self.probe_started = now
+        return True
+
+    def on_success(self):
+        """Close the breaker after a successful request"""
+        self.state = self.CLOSED
+        self.backoff = self.initial_backoff
+
+    def on_failure(self):
+        """Open the breaker, doubling the backoff if the probe failed"""
+        if self.state == self.HALF_OPEN:
+            self.backoff = min(self.backoff * 2, self.max_backoff)
+        self.state = self.OPEN
+        self.opened_at = time.monotonic()
+
+    def end_probe(self):
+        """Count a probe that finished without on_success/on_failure (other status, timeout, error) as failed"""
+        if self.state == self.HALF_OPEN:
+            self.on_failure()
+
 class LLMService:
 
     def __init__(self):
@@ -25,9 +248,15 @@ class LLMService:
         self.deepseek_url = "https://api.deepseek.com/v1/chat/completions"
         self.perplexity_url = "https://api.perplexity.ai/chat/completions"
 
+        # Constant system message for web queries (built once, reused for every request)
+        self.perplexity_system_message = {
+            "role": "system",
+            "content": "You are a helpful assistant that provides accurate, up-to-date information from the web. Provide concise, relevant information."
+        }
+
         # Circuit breakers (stop requests if quota exceeded)
-        self.deepseek_disabled = False
-        self.perplexity_disabled = False
+        self.deepseek_breaker = CircuitBreaker(initial_backoff=300, max_backoff=3600)
+        self.perplexity_breaker = CircuitBreaker(initial_backoff=300, max_backoff=3600)
         
         # Define system prompts
         self.system_prompt = """You are a warm, supportive, and encouraging AI assistant with a casual, friendly personality.
@@ -86,132 +315,257 @@ Use this context to understand who said what and reply naturally.
         self.custom_system_prompt = None
         self.static_context = []
 
+        # Cache of recent conversational replies (skips the API for near-duplicate prompts)
+        self.response_cache = ResponseCache()
+
+        # System prompt + static context, prepended to every DeepSeek request
+        self.prefix_messages: List[Dict[str, str]] = []
+        self.refresh_prefix_messages()
+
+        # Shared HTTP session (created lazily, reused across requests)
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._ssl_context = ssl.create_default_context()
+
+    async def _get_session(self) -> aiohttp.ClientSession:
+        """Get the shared HTTP session, creating it if needed"""
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                timeout=aiohttp.ClientTimeout(total=60),
+                connector=aiohttp.TCPConnector(
+                    limit=32,
+                    limit_per_host=16,
+                    ttl_dns_cache=300,
+                    keepalive_timeout=75,
+                    enable_cleanup_closed=True,
+                    # One SSL context for the session so TLS sessions can be resumed
+                    ssl=self._ssl_context
+                ),
+                # Large responses (e.g. Perplexity citations) can exceed the 64KB default buffer
+                read_bufsize=10 * 1024 * 1024
+            )
+        return self._session
+
+    async def aclose(self):
+        """Close the shared HTTP session"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
     def set_system_prompt(self, prompt: str):
         """Set a custom system prompt"""
         self.custom_system_prompt = prompt
+        self.response_cache.clear()
+        self.refresh_prefix_messages()
 
     def reset_system_prompt(self):
         """Reset to default system prompt"""
         self.custom_system_prompt = None
+        self.response_cache.clear()
+        self.refresh_prefix_messages()
 
     def set_static_context(self, context: List[Dict[str, str]]):
         """Set static context from file"""
         self.static_context = context
+        self.response_cache.clear()
+        self.refresh_prefix_messages()
 
     def clear_static_context(self):
         """Clear static context"""
         self.static_context = []
+        self.response_cache.clear()
+        self.refresh_prefix_messages()
+
+
+    def refresh_prefix_messages(self):
+        """Rebuild the cached system prompt + static context prefix"""
+        # Use custom prompt if set, otherwise default
+        current_prompt = self.custom_system_prompt if self.custom_system_prompt else self.system_prompt
+        # Add static context (e.g. from file)
+        self.prefix_messages = [{"role": "system", "content": current_prompt}] + self.static_context
+
+    def build_messages(self, conversation_history: List[Dict[str, str]]) -> List[Dict[str, str]]:
+        """Build the full DeepSeek message list (system prompt + static context + history)"""
+        # Expecting history format: [{"role": "user", "content": "User: message"}, {"role": "assistant", "content": "Bot: message"}]
+        return self.prefix_messages + conversation_history
+
+    def _deepseek_request(self, session: aiohttp.ClientSession, messages: List[Dict[str, str]], temperature: float, stream: bool = False):
+        """Start a DeepSeek chat completion request"""
+        payload = {
+            "model": "deepseek-chat",
+            "messages": messages,
+            "temperature": temperature,
+            "max_tokens": 500
+        }
+        if stream:
+            payload["stream"] = True
+        return session.post(
+            self.deepseek_url,
+            headers={
+                "Authorization": f"Bearer {self.deepseek_api_key}",
+                "Content-Type": "application/json"
+            },
+            data=orjson.dumps(payload)
+        )
 
-
-    async def generate_response(self, conversation_history: List[Dict[str, str]], temperature: float = 0.7) -> str:
+    async def _deepseek_error(self, response: aiohttp.ClientResponse) -> str:
+        """Log a failed DeepSeek response and return the user-facing error message"""
+        error_text = await response.text()
+        logger.error("DeepSeek API error: %s - %s", response.status, error_text)
+        if response.status == 402:
+            self.deepseek_breaker.on_failure()
+            return "❌ **API Quota Exceeded**: The bot has run out of DeepSeek credits. Requests are paused and will be retried later."
+        if response.status == 429:
+            self.deepseek_breaker.on_failure()
+            return "⏳ **Rate Limited**: The bot is sending too many messages. Please try again later."
+        return f"Error: Failed to get response from AI provider ({response.status})"
+
+    async def generate_response(self, conversation_history: List[Dict[str, str]], temperature: float = 0.7, use_cache: bool = False) -> str:
         """Generate response using DeepSeek API based on conversation history"""
-        if self.deepseek_disabled:
-             return "❌ **API Quota Exceeded**: DeepSeek is disabled until restart or manual reset."
+        cache_key = conversation_history[-1]["content"] if use_cache and conversation_history else None
+        cache_context = self.response_cache.context_key(conversation_history)
+        if cache_key:
+            cached = self.response_cache.get(cache_key, cache_context)
+            if cached is not None:
+                return cached
 
         if not self.deepseek_api_key:
             return "❌ DeepSeek API key not configured."
 
+        if not self.deepseek_breaker.allow():
+            return "❌ **API Quota Exceeded**: DeepSeek is paused and will be retried automatically later."
+        probing = self.deepseek_breaker.state == CircuitBreaker.HALF_OPEN
+
         try:
-            # Use custom prompt if set, otherwise default
-            current_prompt = self.custom_system_prompt if self.custom_system_prompt else self.system_prompt
-            messages = [{"role": "system", "content": current_prompt}]
-            
-            # Add static context (e.g. from file)
-            if self.static_context:
-                messages.extend(self.static_context)
-            
-            # Add conversation history
-            # Expecting history format: [{"role": "user", "content": "User: message"}, {"role": "assistant", "content": "Bot: message"}]
-            messages.extend(conversation_history)
-
-            async with aiohttp.ClientSession() as session:
-                async with session.post(
-                    self.deepseek_url,
-                    headers={
-                        "Authorization": f"Bearer {self.deepseek_api_key}",
-                        "Content-Type": "application/json"
-                    },
-                    json={
-                        "model": "deepseek-chat",
-                        "messages": messages,
-                        "temperature": temperature,
-                        "max_tokens": 500
-                    }
-                ) as response:
-                    if response.status != 200:
-                        error_text = await response.text()
-                        logger.error(f"DeepSeek API error: {response.status} - {error_text}")
-                        if response.status == 402:
-                            self.deepseek_disabled = True
-                            return "❌ **API Quota Exceeded**: The bot has run out of DeepSeek credits. Further requests are blocked."
-                        if response.status == 429:
-                            return "⏳ **Rate Limited**: The bot is sending too many messages. Please try again later."
-                        return f"Error: Failed to get response from AI provider ({response.status})"
-                    
-                    data = await response.json()
-                    if 'choices' in data and len(data['choices']) > 0:
-                        return data['choices'][0]['message']['content'].strip()
-                    return "Error: Empty response from AI."
+            messages = self.build_messages(conversation_history)
+
+            session = await self._get_session()
+            async with self._deepseek_request(session, messages, temperature) as response:
+                if response.status != 200:
+                    return await self._deepseek_error(response)
+                
+                self.deepseek_breaker.on_success()
+                data = orjson.loads(await response.read())
+                if 'choices' in data and len(data['choices']) > 0:
+                    reply = data['choices'][0]['message']['content'].strip()
+                    if cache_key:
+                        self.response_cache.put(cache_key, reply, cache_context)
+                    return reply
+                return "Error: Empty response from AI."
 
         except Exception as e:
-            logger.error(f"Error in generate_response: {str(e)}")
+            logger.error("Error in generate_response: %s", e)
             return f"Error generating response: {str(e)}"
+        finally:
+            if probing:
+                self.deepseek_breaker.end_probe()
+
+    async def stream_response(self, conversation_history: List[Dict[str, str]], temperature: float = 0.7, use_cache: bool = False) -> AsyncIterator[str]:
+        """Yield the DeepSeek reply in pieces as it streams in.
+        Falls back to a single non-streamed response if streaming fails before any text arrives.
+        """
+        cache_key = conversation_history[-1]["content"] if use_cache and conversation_history else None
+        cache_context = self.response_cache.context_key(conversation_history)
+        cached = self.response_cache.get(cache_key, cache_context) if cache_key else None
+        # Anything other than a healthy breaker goes through generate_response (which sends the probe)
+        if cached is not None or not self.deepseek_breaker.is_closed or not self.deepseek_api_key:
+            yield cached if cached is not None else await self.generate_response(conversation_history, temperature)
+            return
+
+        parts = []
+        try:
+            messages = self.build_messages(conversation_history)
+
+            session = await self._get_session()
+            async with self._deepseek_request(session, messages, temperature, stream=True) as response:
+                if response.status != 200:
+                    yield await self._deepseek_error(response)
+                    return
+                self.deepseek_breaker.on_success()
+
+                # OpenAI-style server-sent events: "data: {...}" lines, terminated by "data: [DONE]"
+                async for line in response.content:
+                    line = line.strip()
+                    if not line.startswith(b"data:"):
+                        continue
+                    payload = line[5:].strip()
+                    if payload == b"[DONE]":
+                        break
+                    choices = orjson.loads(payload).get("choices")
+                    if not choices:
+                        continue
+                    delta = (choices[0].get("delta") or {}).get("content")
+                    if delta and not parts:
+                        delta = delta.lstrip()
+                    if delta:
+                        parts.append(delta)
+                        yield delta
+        except Exception as e:
+            logger.error("Error in stream_response: %s", e)
+            if not parts:
+                yield await self.generate_response(conversation_history, temperature, use_cache=use_cache)
+            return
+
+        if not parts:
+            yield "Error: Empty response from AI."
+        elif cache_key:
+            self.response_cache.put(cache_key, "".join(parts).strip(), cache_context)
 
     async def get_online_information(self, query: str) -> str:
         """Get online information using Perplexity Sonar API"""
-        if self.perplexity_disabled:
-            return "❌ **API Quota Exceeded**: Perplexity is disabled until restart."
-
         if not self.perplexity_api_key:
             return await self._fallback_web_query(query)
 
-        # If Perplexity is disabled, fall back to DeepSeek
-        if self.perplexity_disabled:
-            return await self._fallback_web_query(query)
+        if not self.perplexity_breaker.allow():
+            if not self.deepseek_breaker.is_closed:
+                return "❌ **API Quota Exceeded**: Perplexity and DeepSeek are both paused and will be retried automatically later."
+            return "❌ **API Quota Exceeded**: Perplexity is paused and will be retried automatically later."
+        probing = self.perplexity_breaker.state == CircuitBreaker.HALF_OPEN
 
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.post(
-                    self.perplexity_url,
-                    headers={
-                        "Authorization": f"Bearer {self.perplexity_api_key}",
-                        "Content-Type": "application/json"
-                    },
-                    json={
-                        "model": "sonar",
-                        "messages": [
-                            {
-                                "role": "system",
-                                "content": "You are a helpful assistant that provides accurate, up-to-date information from the web. Provide concise, relevant information."
-                            },
-                            {
-                                "role": "user",
-                                "content": query
-                            }
-                        ],
-                        "max_tokens": 500,
-                        "temperature": 0.2
-                    }
-                ) as response:
-                    if response.status == 200:
-                        result = await response.json()
-                        if 'choices' in result and len(result['choices']) > 0:
-                            content = result['choices'][0]['message']['content']
-                            return content
+            session = await self._get_session()
+            async with session.post(
+                self.perplexity_url,
+                headers={
+                    "Authorization": f"Bearer {self.perplexity_api_key}",
+                    "Content-Type": "application/json"
+                },
+                data=orjson.dumps({
+                    "model": "sonar",
+                    "messages": [
+                        self.perplexity_system_message,
+                        {
+                            "role": "user",
+                            "content": query
+                        }
+                    ],
+                    "max_tokens": 500,
+                    "temperature": 0.2
+                })
+            ) as response:
+                if response.status == 200:
+                    self.perplexity_breaker.on_success()
+                    result = orjson.loads(await response.read())
+                    if 'choices' in result and len(result['choices']) > 0:
+                        content = result['choices'][0]['message']['content']
+                        return content
+                    return await self._fallback_web_query(query)
+                else:
+                    error_text = await response.text()
+                    logger.error("Perplexity API error: %s - %s", response.status, error_text)
+                    if response.status == 402:
+                        self.perplexity_breaker.on_failure()
+                        logger.warning("Perplexity quota exceeded, falling back to DeepSeek")
                         return await self._fallback_web_query(query)
-                    else:
-                        error_text = await response.text()
-                        logger.error(f"Perplexity API error: {response.status} - {error_text}")
-                        if response.status == 402:
-                            self.perplexity_disabled = True
-                            logger.warning("Perplexity quota exceeded, falling back to DeepSeek")
-                            return await self._fallback_web_query(query)
-                        if response.status == 429:
-                            return await self._fallback_web_query(query)
+                    if response.status == 429:
+                        self.perplexity_breaker.on_failure()
                         return await self._fallback_web_query(query)
+                    return await self._fallback_web_query(query)
         except Exception as e:
-            logger.error(f"Error getting online information: {str(e)}")
+            logger.error("Error getting online information: %s", e)
             return await self._fallback_web_query(query)
+        finally:
+            if probing:
+                self.perplexity_breaker.end_probe()
     
     async def _fallback_web_query(self, query: str) -> str:
         """Fallback to DeepSeek when Perplexity is unavailable"""
@@ -226,52 +580,106 @@ Question: {query}"""
 
 
 class AIChat(commands.Cog):
+    # Number of channel messages kept as conversation context
+    HISTORY_LIMIT = 10
+    # Minimum seconds between edits of a streamed reply (Discord allows ~5 edits per 5s)
+    STREAM_EDIT_INTERVAL = 1.0
+    # Prevent @everyone/@here pings in AI replies
+    SAFE_MENTIONS = discord.AllowedMentions(everyone=False, roles=False, users=True)
+
     def __init__(self, bot):
         self.bot = bot
         self.llm_service = LLMService()
-        self.processing_users = set()
+        self.user_locks: Dict[int, asyncio.Lock] = defaultdict(asyncio.Lock)
+        self.pending_requests: Dict[int, int] = defaultdict(int)
+        # Per-channel append-only transcript, so the prompt prefix stays identical between turns
+        self.channel_histories: Dict[int, deque] = {}
+
+    def format_history_entry(self, msg, content: Optional[str] = None) -> Dict[str, str]:
+        """Format a Discord message as a chat history entry"""
+        if content is None:
+            content = msg.content
+        if msg.author == self.bot.user:
+            # Don't include bot's name - just show what it said
+            return {"role": "assistant", "content": content}
+        # Include user's name AND ID for context (so AI can ping them)
+        return {"role": "user", "content": f"{msg.author.display_name} (<@{msg.author.id}>): {content}"}
+
+    def clean_mentions(self, message) -> str:
+        """Strip user mentions from a message's content"""
+        return MENTION_RE.sub('', message.content).strip()
 
     async def get_channel_history(self, channel, limit=10, current_msg=None) -> List[Dict[str, str]]:
         """Fetch and format recent channel history"""
         history = []
         messages = []
         
-        async for msg in channel.history(limit=limit):
+        # Only fetch messages before the current one - we'll add it explicitly.
+        # (oldest_first=True isn't used: without `after` it pages from the start of the channel)
+        async for msg in channel.history(limit=limit, before=current_msg):
             if msg.author.bot and msg.author != self.bot.user:
                 continue  # Skip other bots
             if not msg.content.strip():
                 continue  # Skip empty messages
-            # Skip the current message - we'll add it explicitly
-            if current_msg and msg.id == current_msg.id:
-                continue
             messages.append(msg)
         
-        # Reverse to get chronological order
-        messages = messages[::-1]
-        
-        for msg in messages:
-            if msg.author == self.bot.user:
-                # Don't include bot's name - just show what it said
-                history.append({"role": "assistant", "content": msg.content})
-            else:
-                # Include user's name AND ID for context (so AI can ping them)
-                history.append({"role": "user", "content": f"{msg.author.display_name} (<@{msg.author.id}>): {msg.content}"})
+        # Walk backwards to get chronological order
+        for msg in reversed(messages):
+            history.append(self.format_history_entry(msg))
         
         # Add the current message we need to respond to
         if current_msg:
-            clean_content = current_msg.content
-            for mention in current_msg.mentions:
-                clean_content = clean_content.replace(f'<@{mention.id}>', '').replace(f'<@!{mention.id}>', '')
-            clean_content = clean_content.strip()
-            history.append({
-                "role": "user", 
-                "content": f"{current_msg.author.display_name} (<@{current_msg.author.id}>): {clean_content}"
-            })
+            history.append(self.format_history_entry(current_msg, self.clean_mentions(current_msg)))
         
         return history
 
+    async def get_conversation(self, message, content: str) -> List[Dict[str, str]]:
+        """Get the cached channel transcript with the current message appended
 
+        The message itself is only recorded once answered (see record_exchange), so concurrent
+        requests from different users can't interleave a turn with someone else's reply.
+        """
+        history = self.channel_histories.get(message.channel.id)
+        if history is None:
+            # Seed from Discord once (without the current message); afterwards turns are only appended
+            fetched = await self.get_channel_history(message.channel, limit=self.HISTORY_LIMIT, current_msg=message)
+            history = self.channel_histories.setdefault(message.channel.id, deque(fetched[:-1], maxlen=self.HISTORY_LIMIT))
+        return list(history)[1 - self.HISTORY_LIMIT:] + [self.format_history_entry(message, content)]
+
+    def record_message(self, message):
+        """Append a non-trigger message to an already cached channel transcript"""
+        history = self.channel_histories.get(message.channel.id)
+        if history is None:
+            return
+        if message.author.bot or not message.content.strip():
+            return
+        history.append(self.format_history_entry(message))
 
+    def record_exchange(self, message, content: str, response: str):
+        """Append an answered message (mentions stripped) and the bot's reply to a cached channel transcript"""
+        history = self.channel_histories.get(message.channel.id)
+        if history is not None:
+            history.append(self.format_history_entry(message, content))
+            history.append({"role": "assistant", "content": response})
+
+    async def load_prompt_file(self, path: str) -> Optional[str]:
+        """Read a prompt file off the event loop, reusing the cached text if unchanged on disk"""
+        try:
+            mtime = os.stat(path).st_mtime
+        except FileNotFoundError:
+            return None
+
+        cached = PROMPT_FILE_CACHE.get(path)
+        if cached and cached[0] == mtime:
+            return cached[1]
+
+        def read():
+            with open(path, "r", encoding="utf-8") as f:
+                return f.read()
+
+        text = await asyncio.to_thread(read)
+        PROMPT_FILE_CACHE[path] = (mtime, text)
+        return text
 
     async def cog_load(self):
         """Called when the cog is loaded"""
@@ -279,30 +687,36 @@ class AIChat(commands.Cog):
         
         # Load style_prompt.txt (vocabulary/phrases)
         style_file = "style_prompt.txt"
-        if os.path.exists(style_file):
-            try:
-                with open(style_file, "r", encoding="utf-8") as f:
-                    combined_prompt += f.read() + "\n\n"
-                    logger.info(f"Loaded style profile from {style_file}")
-            except Exception as e:
-                logger.error(f"Failed to load style prompt: {e}")
+        try:
+            style_prompt = await self.load_prompt_file(style_file)
+            if style_prompt is not None:
+                combined_prompt += style_prompt + "\n\n"
+                logger.info("Loaded style profile from %s", style_file)
+        except Exception as e:
+            logger.error("Failed to load style prompt: %s", e)
         
         # Load personality_prompt.txt (vibe/emotional patterns)
         personality_file = "personality_prompt.txt"
-        if os.path.exists(personality_file):
-            try:
-                with open(personality_file, "r", encoding="utf-8") as f:
-                    combined_prompt += f.read()
-                    logger.info(f"Loaded personality profile from {personality_file}")
-            except Exception as e:
-                logger.error(f"Failed to load personality prompt: {e}")
+        try:
+            personality_prompt = await self.load_prompt_file(personality_file)
+            if personality_prompt is not None:
+                combined_prompt += personality_prompt
+                logger.info("Loaded personality profile from %s", personality_file)
+        except Exception as e:
+            logger.error("Failed to load personality prompt: %s", e)
         
         if combined_prompt:
+            # Assigned once so the same prompt string is reused for every request
             self.llm_service.system_prompt = self.llm_service.default_system_prompt + "\n\n" + combined_prompt
-            logger.info(f"Combined style+personality prompt loaded (~{len(combined_prompt)} chars)")
+            self.llm_service.refresh_prefix_messages()
+            logger.info("Combined style+personality prompt loaded (~%d chars)", len(combined_prompt))
         else:
             logger.warning("No style/personality files found. Run analyze_style.py and analyze_personality.py")
 
+    async def cog_unload(self):
+        """Called when the cog is unloaded"""
+        await self.llm_service.aclose()
+
     async def translate_to_style(self, text: str) -> str:
         """Translate formal text (like Perplexity output) into the user's casual style"""
         # Use DeepSeek to rewrite the response in the user's style
@@ -316,11 +730,7 @@ class AIChat(commands.Cog):
 Original info:
 """ + text + "\n\nRewritten (casual/chill):"
         
-        messages = [
-            {"role": "system", "content": self.llm_service.system_prompt},
-            {"role": "user", "content": translate_prompt}
-        ]
-        
+        # generate_response already prepends the system prompt
         try:
             translated = await self.llm_service.generate_response([{"role": "user", "content": translate_prompt}])
             return translated
@@ -333,65 +743,44 @@ Original info:
         vs conversational response (DeepSeek)
         """
         text_lower = text.lower()
-        
-        # Patterns that indicate need for real-time/web information
-        web_patterns = [
-            # Weather
-            r"weather\s+(in|at|for|today|tomorrow|this week)",
-            r"(what's|whats|what is)\s+the\s+weather",
-            r"is it (raining|snowing|sunny|cold|hot)",
-            # News/Current events
-            r"(latest|recent|current|today's|breaking)\s+(news|updates|headlines)",
-            r"what('s| is) happening (in|with|at)",
-            r"news (about|on|regarding)",
-            # Sports/Scores
-            r"(score|result|who won|did .+ win)",
-            r"(game|match|fight)\s+(today|yesterday|last night)",
-            # Stock/Crypto prices
-            r"(price|stock|crypto|bitcoin|eth)\s+(of|for|today|now)",
-            r"how much is .+ (worth|trading|today)",
-            # Time-sensitive info
-            r"(current|right now|today|this week|this month)",
-            r"(when|what time) (is|does|will)",
-            r"hours (of|for)",
-            r"(open|closed|operating)\s+hours",
-            # Search/lookup
-            r"(search|google|look up|find)\s+(for|about)?",
-            r"who is .+ (dating|married|president|ceo)",
-            r"how (old|tall|much) is",
-            # Facts that may change
-            r"(population|capital|president|ceo|leader) of",
-        ]
-        
-        import re
-        for pattern in web_patterns:
-            if re.search(pattern, text_lower):
-                return True
-        
-        # Keywords that strongly suggest web search
-        web_keywords = [
-            'weather', 'forecast', 'news', 'headlines', 'score', 'results',
-            'stock', 'stocks', 'crypto', 'bitcoin', 'price', 'prices',
-            'latest', 'recent', 'current', 'today', 'yesterday', 'tonight',
-            'breaking', 'update', 'updates', 'live', 'real-time', 'realtime',
-            'search', 'google', 'lookup', 'find out', 'what happened',
-            'election', 'vote', 'poll', 'market', 'nasdaq', 'dow',
-        ]
-        
-        # Check for strong web keywords
-        for keyword in web_keywords:
-            if keyword in text_lower:
-                # But filter out false positives for casual usage
-                casual_patterns = [
-                    "how's your day", "what's up", "how are you", 
-                    "good morning", "good night", "today I", "today i",
-                    "my day", "your day"
-                ]
-                if not any(casual in text_lower for casual in casual_patterns):
-                    return True
+
+        # Single combined scan over all real-time/web patterns
+        if WEB_PATTERN_RE.search(text_lower):
+            return True
+
+        # Check for strong web keywords, but filter out false positives for casual usage
+        has_keyword = not WEB_KEYWORDS.isdisjoint(WORD_RE.findall(text_lower)) or WEB_PHRASE_RE.search(text_lower)
+        if has_keyword and not CASUAL_RE.search(text_lower):
+            return True
         
         return False
 
+    async def send_streamed_reply(self, message, chunks: AsyncIterator[str], allowed_mentions: discord.AllowedMentions) -> str:
+        """Reply with streamed text, editing the reply at most once per STREAM_EDIT_INTERVAL seconds"""
+        reply = None
+        text = ""
+        shown = ""
+        last_edit = 0.0
+
+        async for chunk in chunks:
+            text += chunk
+            now = time.monotonic()
+            if reply is None:
+                shown = text[:2000]
+                reply = await message.reply(shown, mention_author=True, allowed_mentions=allowed_mentions)
+                last_edit = now
+            elif now - last_edit >= self.STREAM_EDIT_INTERVAL and text[:2000] != shown:
+                shown = text[:2000]
+                await reply.edit(content=shown, allowed_mentions=allowed_mentions)
+                last_edit = now
+
+        text = text.strip()
+        if reply is None:
+            await message.reply(text or "Error: Empty response from AI.", mention_author=True, allowed_mentions=allowed_mentions)
+        elif text[:2000] != shown:
+            await reply.edit(content=text[:2000], allowed_mentions=allowed_mentions)
+        return text
+
     @commands.Cog.listener()
     async def on_message(self, message):
         # Ignore own messages
@@ -409,43 +798,50 @@ Original info:
         )
 
         if is_mentioned or is_reply_to_bot:
-            if message.author.id in self.processing_users:
-                return # Prevent spam/double processing
-            
-            self.processing_users.add(message.author.id)
+            # Queue mentions from the same user so they are answered in order, one at a time
+            user_id = message.author.id
+            lock = self.user_locks[user_id]
+            self.pending_requests[user_id] += 1
             try:
-                async with message.channel.typing():
+                async with lock, message.channel.typing():
                     # Get the actual message content (remove bot mention)
-                    content = message.content
-                    for mention in message.mentions:
-                        content = content.replace(f'<@{mention.id}>', '').replace(f'<@!{mention.id}>', '')
-                    content = content.strip()
+                    content = self.clean_mentions(message)
                     
                     # Smart routing: decide Perplexity vs DeepSeek
                     if self.needs_web_search(content):
-                        logger.info(f"Smart routing: Using Perplexity for query: {content[:50]}...")
+                        if logger.isEnabledFor(logging.INFO):
+                            logger.info("Smart routing: Using Perplexity for query: %s...", content[:50])
                         raw_response = await self.llm_service.get_online_information(content)
                         # Translate Perplexity's formal response to user's casual style
                         response = await self.translate_to_style(raw_response)
+
+                        # Reply to user
+                        await message.reply(response, mention_author=True, allowed_mentions=self.SAFE_MENTIONS)
                     else:
                         # Get channel context for conversational response
-                        history = await self.get_channel_history(message.channel, current_msg=message)
-                        response = await self.llm_service.generate_response(history)
-
-                    
-                    # Reply to user
-                    # Prevent @everyone/@here pings
-                    safe_mentions = discord.AllowedMentions(everyone=False, roles=False, users=True)
-                    await message.reply(response, mention_author=True, allowed_mentions=safe_mentions)
+                        history = await self.get_conversation(message, content)
+                        # Reply to user, editing the reply as the response streams in
+                        response = await self.send_streamed_reply(
+                            message,
+                            self.llm_service.stream_response(history, use_cache=True),
+                            self.SAFE_MENTIONS
+                        )
+                    self.record_exchange(message, content, response)
 
             except Exception as e:
-                logger.error(f"Error in on_message AI handler: {e}")
+                logger.error("Error in on_message AI handler: %s", e)
                 try:
                     await message.add_reaction("❌")
                 except Exception:
                     pass  # Session might be closed, ignore
             finally:
-                self.processing_users.discard(message.author.id)
+                # Drop the lock once nobody is holding or waiting on it
+                self.pending_requests[user_id] -= 1
+                if not self.pending_requests[user_id]:
+                    del self.pending_requests[user_id]
+                    self.user_locks.pop(user_id, None)
+        else:
+            self.record_message(message)
 
 
     @commands.command(name="ask")
@@ -456,9 +852,9 @@ Original info:
             
             # Split response if too long
             if len(response) > 2000:
-                # Split into chunks
-                for i in range(0, len(response), 1990):
-                    await ctx.send(response[i:i+1990])
+                # Split into chunks on line boundaries
+                for chunk in chunk_message(response):
+                    await ctx.send(chunk)
             else:
                 await ctx.send(response)
 
@@ -486,25 +882,9 @@ Original info:
             return
 
         try:
-            # Read file content
+            # Read file content, then parse and validate it off the event loop
             content = await attachment.read()
-            data = json.loads(content)
-
-            # Validate format (list of dicts with role/content)
-            if not isinstance(data, list):
-                raise ValueError("Root element must be a list")
-            
-            valid_history = []
-            for item in data:
-                if not isinstance(item, dict) or 'role' not in item or 'content' not in item:
-                    continue # Skip invalid items
-                
-                # Normalize roles
-                role = item['role'].lower()
-                if role not in ['user', 'assistant', 'system']:
-                    role = 'user' # Default to user if unknown
-                
-                valid_history.append({"role": role, "content": str(item['content'])})
+            valid_history = await asyncio.to_thread(parse_history, content)
 
             if not valid_history:
                 await ctx.send("❌ No valid messages found in the JSON file.")
@@ -513,10 +893,10 @@ Original info:
             self.llm_service.set_static_context(valid_history)
             await ctx.send(f"✅ Loaded {len(valid_history)} messages into context memory.")
 
-        except json.JSONDecodeError:
+        except orjson.JSONDecodeError:
             await ctx.send("❌ Invalid JSON format.")
         except Exception as e:
-            logger.error(f"Error loading history: {e}")
+            logger.error("Error loading history: %s", e)
             await ctx.send(f"❌ Error loading file: {e}")
 
     @commands.command(name="clear_history")
@@ -3,96 +3,189 @@ import re
 from dotenv import load_dotenv
 from typing import List, Optional
 
-# Load environment variables
-load_dotenv()
+# Prefer google-re2 (linear-time DFA) for the validation patterns when installed
+try:
+    import re2 as _re
+except ImportError:
+    _re = re
 
-class BotConfig:
-    """Bot configuration settings with comprehensive validation"""
+# Load environment variables once per process. The flag is module state (kept across reloads, which
+# reuse the module dict) rather than an os.environ sentinel that child processes would inherit
+_DOTENV_LOADED = globals().get('_DOTENV_LOADED', False)
+if not _DOTENV_LOADED:
+    load_dotenv()
+    _DOTENV_LOADED = True
+
+# Byte-size constants (folded once instead of multiplied per check)
+_MB = 1 << 20
+_MIN_FILE_SIZE = _MB
+_MAX_FILE_SIZE = 100 * _MB
+
+# Accepted Discord bot token prefixes
+_TOKEN_PREFIXES = ('MT', 'OD', 'Nz')
+
+def _env_bool(value) -> bool:
+    return str(value).lower() == 'true'
+
+def _env_mb(value) -> int:
+    return int(value) * _MB  # Convert MB to bytes
 
+# Environment-backed settings: attribute -> (env var, default, cast).
+# Each value is read and coerced on first access, then cached on the class.
+_ENV_SCHEMA = {
     # ==============================================
     # DISCORD SETTINGS
     # ==============================================
-    TOKEN = os.getenv('DISCORD_BOT_TOKEN')
+    'TOKEN': ('DISCORD_BOT_TOKEN', None, lambda value: value),
 
     # ==============================================
     # FILE SETTINGS
     # ==============================================
-    MAX_FILE_SIZE = int(os.getenv('MAX_FILE_SIZE_MB', 10)) * 1024 * 1024  # Convert MB to bytes
-    ALLOWED_EXTENSIONS = ['.pdf']
-    MAX_FILES_PER_USER = int(os.getenv('MAX_FILES_PER_USER', 100))
-
-    # ==============================================
-    # STORAGE DIRECTORIES
-    # ==============================================
-    FILES_DIR = 'files'
-    WATERMARKED_DIR = 'watermarked'
-    LOGS_DIR = 'logs'
-    BACKUP_DIR = 'backups'
+    'MAX_FILE_SIZE': ('MAX_FILE_SIZE_MB', 10, _env_mb),
+    'MAX_FILES_PER_USER': ('MAX_FILES_PER_USER', 100, int),
 
     # ==============================================
     # WATERMARK SETTINGS
     # ==============================================
-    WATERMARK_OPACITY = float(os.getenv('WATERMARK_OPACITY', 0.3))
-    WATERMARK_FONT_SIZE = int(os.getenv('WATERMARK_FONT_SIZE', 24))
-    WATERMARK_SMALL_FONT_SIZE = int(os.getenv('WATERMARK_SMALL_FONT_SIZE', 12))
-    WATERMARK_COLOR_RED = float(os.getenv('WATERMARK_COLOR_RED', 0.7))
-    WATERMARK_COLOR_GREEN = float(os.getenv('WATERMARK_COLOR_GREEN', 0.7))
-    WATERMARK_COLOR_BLUE = float(os.getenv('WATERMARK_COLOR_BLUE', 0.7))
+    'WATERMARK_OPACITY': ('WATERMARK_OPACITY', 0.3, float),
+    'WATERMARK_FONT_SIZE': ('WATERMARK_FONT_SIZE', 24, int),
+    'WATERMARK_SMALL_FONT_SIZE': ('WATERMARK_SMALL_FONT_SIZE', 12, int),
+    'WATERMARK_COLOR_RED': ('WATERMARK_COLOR_RED', 0.7, float),
+    'WATERMARK_COLOR_GREEN': ('WATERMARK_COLOR_GREEN', 0.7, float),
+    'WATERMARK_COLOR_BLUE': ('WATERMARK_COLOR_BLUE', 0.7, float),
 
     # ==============================================
     # DATABASE SETTINGS
     # ==============================================
-    DATABASE_NAME = 'notes_database.db'
-    DATABASE_BACKUP_INTERVAL_HOURS = int(os.getenv('DATABASE_BACKUP_INTERVAL_HOURS', 24))
-    DATABASE_CLEANUP_DAYS = int(os.getenv('DATABASE_CLEANUP_DAYS', 90))
+    'DATABASE_BACKUP_INTERVAL_HOURS': ('DATABASE_BACKUP_INTERVAL_HOURS', 24, int),
+    'DATABASE_CLEANUP_DAYS': ('DATABASE_CLEANUP_DAYS', 90, int),
 
     # ==============================================
     # RATE LIMITING SETTINGS
     # ==============================================
-    MAX_UPLOADS_PER_HOUR = int(os.getenv('MAX_UPLOADS_PER_HOUR', 20))
-    MAX_DOWNLOADS_PER_HOUR = int(os.getenv('MAX_DOWNLOADS_PER_HOUR', 50))
-    ENABLE_RATE_LIMITING = os.getenv('ENABLE_RATE_LIMITING', 'true').lower() == 'true'
+    'MAX_UPLOADS_PER_HOUR': ('MAX_UPLOADS_PER_HOUR', 20, int),
+    'MAX_DOWNLOADS_PER_HOUR': ('MAX_DOWNLOADS_PER_HOUR', 50, int),
+    'ENABLE_RATE_LIMITING': ('ENABLE_RATE_LIMITING', 'true', _env_bool),
 
     # ==============================================
     # SECURITY SETTINGS
     # ==============================================
-    ENABLE_IP_LOGGING = os.getenv('ENABLE_IP_LOGGING', 'false').lower() == 'true'
-    CLEANUP_TEMP_FILES = os.getenv('CLEANUP_TEMP_FILES', 'true').lower() == 'true'
+    'ENABLE_IP_LOGGING': ('ENABLE_IP_LOGGING', 'false', _env_bool),
+    'CLEANUP_TEMP_FILES': ('CLEANUP_TEMP_FILES', 'true', _env_bool),
 
     # ==============================================
     # ADMIN SETTINGS
     # ==============================================
-    ADMIN_ROLE_NAME = os.getenv('ADMIN_ROLE_NAME', 'Admin')
-    MODERATOR_ROLE_NAME = os.getenv('MODERATOR_ROLE_NAME', 'Moderator')
+    'ADMIN_ROLE_NAME': ('ADMIN_ROLE_NAME', 'Admin', str),
+    'MODERATOR_ROLE_NAME': ('MODERATOR_ROLE_NAME', 'Moderator', str),
 
     # ==============================================
     # FEATURE FLAGS
     # ==============================================
-    ENABLE_SEARCH = os.getenv('ENABLE_SEARCH', 'true').lower() == 'true'
-    ENABLE_BULK_OPERATIONS = os.getenv('ENABLE_BULK_OPERATIONS', 'true').lower() == 'true'
-    ENABLE_STATISTICS = os.getenv('ENABLE_STATISTICS', 'true').lower() == 'true'
+    'ENABLE_SEARCH': ('ENABLE_SEARCH', 'true', _env_bool),
+    'ENABLE_BULK_OPERATIONS': ('ENABLE_BULK_OPERATIONS', 'true', _env_bool),
+    'ENABLE_STATISTICS': ('ENABLE_STATISTICS', 'true', _env_bool),
 
     # ==============================================
     # PERFORMANCE SETTINGS
     # ==============================================
-    CACHE_SIZE_MB = int(os.getenv('CACHE_SIZE_MB', 100))
-    MAX_CONCURRENT_UPLOADS = int(os.getenv('MAX_CONCURRENT_UPLOADS', 5))
-    MAX_CONCURRENT_DOWNLOADS = int(os.getenv('MAX_CONCURRENT_DOWNLOADS', 10))
+    'CACHE_SIZE_MB': ('CACHE_SIZE_MB', 100, int),
+    'MAX_CONCURRENT_UPLOADS': ('MAX_CONCURRENT_UPLOADS', 5, int),
+    'MAX_CONCURRENT_DOWNLOADS': ('MAX_CONCURRENT_DOWNLOADS', 10, int),
 
     # ==============================================
     # LOGGING SETTINGS
     # ==============================================
-    LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
-    ENABLE_METRICS = os.getenv('ENABLE_METRICS', 'true').lower() == 'true'
-    LOG_RETENTION_DAYS = int(os.getenv('LOG_RETENTION_DAYS', 30))
+    'LOG_LEVEL': ('LOG_LEVEL', 'INFO', str),
+    'ENABLE_METRICS': ('ENABLE_METRICS', 'true', _env_bool),
+    'LOG_RETENTION_DAYS': ('LOG_RETENTION_DAYS', 30, int),
+}
+
+class _LazyEnvConfig(type):
+    """Metaclass that resolves environment-backed settings on first access"""
+
+    def __getattr__(cls, name):
+        try:
+            env_name, default, cast = _ENV_SCHEMA[name]
+        except KeyError:
+            raise AttributeError(f"{cls.__name__} has no setting {name!r}") from None
+        value = cast(os.getenv(env_name, default))
+        setattr(cls, name, value)  # Cache so later lookups skip __getattr__
+        return value
+
+# Declarative range checks for validate_all: (attribute, predicate, error message)
+_VALIDATION_RULES = (
+    # File size validation
+    ('MAX_FILE_SIZE', lambda v: v > _MIN_FILE_SIZE, "MAX_FILE_SIZE_MB must be at least 1MB"),  # 1MB minimum
+    ('MAX_FILE_SIZE', lambda v: v <= _MAX_FILE_SIZE, "MAX_FILE_SIZE_MB cannot exceed 100MB"),  # 100MB maximum
+
+    # Watermark settings validation
+    ('WATERMARK_OPACITY', lambda v: 0 < v < 1, "WATERMARK_OPACITY must be between 0 and 1"),
+    ('WATERMARK_FONT_SIZE', lambda v: 8 <= v <= 72, "WATERMARK_FONT_SIZE must be between 8 and 72"),
+    ('WATERMARK_SMALL_FONT_SIZE', lambda v: 6 <= v <= 24, "WATERMARK_SMALL_FONT_SIZE must be between 6 and 24"),
+
+    # Rate limiting validation
+    ('MAX_UPLOADS_PER_HOUR', lambda v: 1 <= v <= 1000, "MAX_UPLOADS_PER_HOUR must be between 1 and 1000"),
+    ('MAX_DOWNLOADS_PER_HOUR', lambda v: 1 <= v <= 1000, "MAX_DOWNLOADS_PER_HOUR must be between 1 and 1000"),
+
+    # Database settings validation
+    ('DATABASE_BACKUP_INTERVAL_HOURS', lambda v: 1 <= v <= 168, "DATABASE_BACKUP_INTERVAL_HOURS must be between 1 and 168"),  # Max 1 week
+    ('DATABASE_CLEANUP_DAYS', lambda v: 1 <= v <= 365, "DATABASE_CLEANUP_DAYS must be between 1 and 365"),
+
+    # Performance settings validation
+    ('MAX_CONCURRENT_UPLOADS', lambda v: 1 <= v <= 20, "MAX_CONCURRENT_UPLOADS must be between 1 and 20"),
+    ('MAX_CONCURRENT_DOWNLOADS', lambda v: 1 <= v <= 50, "MAX_CONCURRENT_DOWNLOADS must be between 1 and 50"),
+
+    # Log retention validation
+    ('LOG_RETENTION_DAYS', lambda v: 1 <= v <= 365, "LOG_RETENTION_DAYS must be between 1 and 365"),
+)
+
+# Watermark color channels checked by validate_all: (name, attribute)
+_COLORS = (
+    ('RED', 'WATERMARK_COLOR_RED'),
+    ('GREEN', 'WATERMARK_COLOR_GREEN'),
+    ('BLUE', 'WATERMARK_COLOR_BLUE'),
+)
+
+class BotConfig(metaclass=_LazyEnvConfig):
+    """Bot configuration settings with comprehensive validation"""
+
+    # ==============================================
+    # FILE SETTINGS
+    # ==============================================
+    ALLOWED_EXTENSIONS = ('.pdf',)  # Tuple so it can be passed straight to str.endswith
+
+    # ==============================================
+    # STORAGE DIRECTORIES
+    # ==============================================
+    FILES_DIR = 'files'
+    WATERMARKED_DIR = 'watermarked'
+    LOGS_DIR = 'logs'
+    BACKUP_DIR = 'backups'
+
+    # ==============================================
+    # DATABASE SETTINGS
+    # ==============================================
+    DATABASE_NAME = 'notes_database.db'
+
+    # Cached RGB tuple for get_watermark_color
+    _watermark_color: Optional[tuple] = None
 
     # ==============================================
     # VALIDATION PATTERNS
     # ==============================================
-    COURSE_CODE_PATTERN = re.compile(r'^[A-Z]{3,4}[0-9]{4}$')
-    LECTURE_NUMBER_PATTERN = re.compile(r'^[A-Za-z0-9\-_]{1,10}$')
-    NOTE_TAKER_PATTERN = re.compile(r'^[A-Za-z0-9\-_]{1,30}$')
-    FILE_ID_PATTERN = re.compile(r'^[a-f0-9\-]{8,36}$')
+    COURSE_CODE_PATTERN = _re.compile(r'^[A-Z]{3,4}[0-9]{4}$')
+    LECTURE_NUMBER_PATTERN = _re.compile(r'^[A-Za-z0-9\-_]{1,10}$')
+    NOTE_TAKER_PATTERN = _re.compile(r'^[A-Za-z0-9\-_]{1,30}$')
+    FILE_ID_PATTERN = _re.compile(r'^[a-f0-9\-]{8,36}$')
+
+    # Field name -> pattern, used by validate_input
+    INPUT_PATTERNS = {
+        'course_code': COURSE_CODE_PATTERN,
+        'lecture_number': LECTURE_NUMBER_PATTERN,
+        'note_taker': NOTE_TAKER_PATTERN,
+        'file_id': FILE_ID_PATTERN,
+    }
 
     @classmethod
     def validate_all(cls) -> List[str]:
@@ -102,57 +195,19 @@ class BotConfig:
         # Required settings
         if not cls.TOKEN:
             errors.append("DISCORD_BOT_TOKEN environment variable is required")
-        elif not cls.TOKEN.startswith(('MT', 'OD', 'Nz')):
+        elif not cls.TOKEN.startswith(_TOKEN_PREFIXES):
             errors.append("DISCORD_BOT_TOKEN appears to be invalid (should start with MT, OD, or Nz)")
 
-        # File size validation
-        if cls.MAX_FILE_SIZE <= 1024 * 1024:  # 1MB minimum
-            errors.append("MAX_FILE_SIZE_MB must be at least 1MB")
-        if cls.MAX_FILE_SIZE > 100 * 1024 * 1024:  # 100MB maximum
-            errors.append("MAX_FILE_SIZE_MB cannot exceed 100MB")
-
-        # Watermark settings validation
-        if not 0 < cls.WATERMARK_OPACITY < 1:
-            errors.append("WATERMARK_OPACITY must be between 0 and 1")
-        
-        if cls.WATERMARK_FONT_SIZE < 8 or cls.WATERMARK_FONT_SIZE > 72:
-            errors.append("WATERMARK_FONT_SIZE must be between 8 and 72")
-        
-        if cls.WATERMARK_SMALL_FONT_SIZE < 6 or cls.WATERMARK_SMALL_FONT_SIZE > 24:
-            errors.append("WATERMARK_SMALL_FONT_SIZE must be between 6 and 24")
+        # Range checks, one pass over the rule table
+        for name, predicate, message in _VALIDATION_RULES:
+            if not predicate(getattr(cls, name)):
+                errors.append(message)
 
         # Color validation
-        for color_name, color_value in [('RED', cls.WATERMARK_COLOR_RED), 
-                                       ('GREEN', cls.WATERMARK_COLOR_GREEN), 
-                                       ('BLUE', cls.WATERMARK_COLOR_BLUE)]:
-            if not 0 <= color_value <= 1:
+        for color_name, attr in _COLORS:
+            if not 0 <= getattr(cls, attr) <= 1:
                 errors.append(f"WATERMARK_COLOR_{color_name} must be between 0 and 1")
 
-        # Rate limiting validation
-        if cls.MAX_UPLOADS_PER_HOUR < 1 or cls.MAX_UPLOADS_PER_HOUR > 1000:
-            errors.append("MAX_UPLOADS_PER_HOUR must be between 1 and 1000")
-        
-        if cls.MAX_DOWNLOADS_PER_HOUR < 1 or cls.MAX_DOWNLOADS_PER_HOUR > 1000:
-            errors.append("MAX_DOWNLOADS_PER_HOUR must be between 1 and 1000")
-
-        # Database settings validation
-        if cls.DATABASE_BACKUP_INTERVAL_HOURS < 1 or cls.DATABASE_BACKUP_INTERVAL_HOURS > 168:  # Max 1 week
-            errors.append("DATABASE_BACKUP_INTERVAL_HOURS must be between 1 and 168")
-        
-        if cls.DATABASE_CLEANUP_DAYS < 1 or cls.DATABASE_CLEANUP_DAYS > 365:
-            errors.append("DATABASE_CLEANUP_DAYS must be between 1 and 365")
-
-        # Performance settings validation
-        if cls.MAX_CONCURRENT_UPLOADS < 1 or cls.MAX_CONCURRENT_UPLOADS > 20:
-            errors.append("MAX_CONCURRENT_UPLOADS must be between 1 and 20")
-        
-        if cls.MAX_CONCURRENT_DOWNLOADS < 1 or cls.MAX_CONCURRENT_DOWNLOADS > 50:
-            errors.append("MAX_CONCURRENT_DOWNLOADS must be between 1 and 50")
-
-        # Log retention validation
-        if cls.LOG_RETENTION_DAYS < 1 or cls.LOG_RETENTION_DAYS > 365:
-            errors.append("LOG_RETENTION_DAYS must be between 1 and 365")
-
         return errors
 
     @classmethod
@@ -164,18 +219,13 @@ class BotConfig:
 
     @classmethod
     def get_watermark_color(cls) -> tuple:
-        """Get watermark color as RGB tuple"""
-        return (cls.WATERMARK_COLOR_RED, cls.WATERMARK_COLOR_GREEN, cls.WATERMARK_COLOR_BLUE)
+        """Get watermark color as RGB tuple (built once, then cached)"""
+        if cls._watermark_color is None:
+            cls._watermark_color = (cls.WATERMARK_COLOR_RED, cls.WATERMARK_COLOR_GREEN, cls.WATERMARK_COLOR_BLUE)
+        return cls._watermark_color
 
     @classmethod
     def validate_input(cls, field: str, value: str) -> bool:
         """Validate user input against patterns"""
-        if field == 'course_code':
-            return bool(cls.COURSE_CODE_PATTERN.match(value))
-        elif field == 'lecture_number':
-            return bool(cls.LECTURE_NUMBER_PATTERN.match(value))
-        elif field == 'note_taker':
-            return bool(cls.NOTE_TAKER_PATTERN.match(value))
-        elif field == 'file_id':
-            return bool(cls.FILE_ID_PATTERN.match(value))
-        return False
\ No newline at end of file
+        pattern = cls.INPUT_PATTERNS.get(field)
+        return bool(pattern and pattern.match(value))
\ No newline at end of file
@@ -11,19 +11,21 @@ import time
 from pathlib import Path
 from typing import Optional, List, Dict, Tuple
 import aiosqlite
-from datetime import datetime, timedelta
-from collections import defaultdict
+from datetime import datetime
+from collections import deque
 import json
+import re
+import orjson
 import shutil
+import gzip
 import tempfile
+import contextlib
+from contextlib import asynccontextmanager
+import aiohttp
 
-# PDF Libraries
-import io
-from PyPDF2 import PdfReader, PdfWriter
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import letter
-from reportlab.lib.colors import Color
-import math
+# PDF watermarking (runs in a process pool)
+import concurrent.futures
+from watermark import WATERMARK_WORKERS, warm_up_worker, watermark_pdf_file
 
 # Configuration
 from config import BotConfig
@@ -43,8 +45,10 @@ except Exception as e:
 # Configure logging with structured format
 class StructuredFormatter(logging.Formatter):
     def format(self, record):
+        # Reuse the timestamp logging already took for the record instead of calling datetime.now()
+        timestamp = time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(record.created))
         log_data = {
-            'timestamp': datetime.now().isoformat(),
+            'timestamp': f"{timestamp}.{int(record.msecs):03d}",
             'level': record.levelname,
             'logger': record.name,
             'message': record.getMessage(),
@@ -52,7 +56,7 @@ class StructuredFormatter(logging.Formatter):
             'function': record.funcName,
             'line': record.lineno
         }
-        return json.dumps(log_data)
+        return orjson.dumps(log_data).decode()
 
 # Setup logging
 logging.basicConfig(
@@ -65,12 +69,23 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# Rate limiting storage
-rate_limits: Dict[int, Dict[str, List[float]]] = defaultdict(lambda: defaultdict(list))
+# Rate limiting storage: (user_id, action) -> timestamps in the current window, oldest first
+rate_limits: Dict[Tuple[int, str], deque] = {}
 
 class RateLimiter:
     """Rate limiting utility"""
     
+    @staticmethod
+    def _prune(user_id: int, action: str, now: float, window: int) -> deque:
+        """Get the user's action timestamps with entries outside the window removed"""
+        key = (user_id, action)
+        user_actions = rate_limits.get(key)
+        if user_actions is None:
+            user_actions = rate_limits[key] = deque()
+        while user_actions and now - user_actions[0] >= window:
+            user_actions.popleft()
+        return user_actions
+
     @staticmethod
     def check_rate_limit(user_id: int, action: str, limit: int, window: int = 3600) -> bool:
         """Check if user is within rate limits"""
@@ -78,10 +93,7 @@ class RateLimiter:
             return True
             
         now = time.time()
-        user_actions = rate_limits[user_id][action]
-        
-        # Remove old entries outside the window
-        user_actions[:] = [t for t in user_actions if now - t < window]
+        user_actions = RateLimiter._prune(user_id, action, now, window)
         
         # Check if under limit
         if len(user_actions) >= limit:
@@ -94,11 +106,291 @@ class RateLimiter:
     @staticmethod
     def get_remaining_actions(user_id: int, action: str, limit: int, window: int = 3600) -> int:
         """Get remaining actions for user"""
-        now = time.time()
-        user_actions = rate_limits[user_id][action]
-        user_actions[:] = [t for t in user_actions if now - t < window]
+        user_actions = RateLimiter._prune(user_id, action, time.time(), window)
         return max(0, limit - len(user_actions))
 
+    @staticmethod
+    def cleanup_expired(window: int = 3600):
+        """Drop users whose actions have all left the window"""
+        cutoff = time.time() - window
+        for key in [key for key, user_actions in rate_limits.items() if not user_actions or user_actions[-1] <= cutoff]:
+            del rate_limits[key]
+
+# Per-connection SQLite tuning (journal_mode=WAL is persistent and set in init_database)
+CONNECTION_PRAGMAS = (
+    "PRAGMA foreign_keys = ON",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA cache_size = -20000",  # ~20MB per connection; the pool keeps several open
+    "PRAGMA busy_timeout = 5000",
+    "PRAGMA mmap_size = 268435456",
+)
+
+# Connections kept open for slash commands (SQLite allows one writer, readers run alongside in WAL)
+DB_POOL_SIZE = 4
+
+# UPSERT ... RETURNING needs SQLite 3.35+; older builds claim upload slots with two statements
+SQLITE_HAS_RETURNING = sqlite3.sqlite_version_info >= (3, 35, 0)
+
+# Most rows /search will page through (40 pages of 5)
+SEARCH_RESULT_CAP = 200
+
+# Rows fetched per thread hop when a cursor is iterated with async for (aiosqlite defaults to 64);
+# sized so a capped /search streams in a single hop
+DB_ITER_CHUNK_SIZE = SEARCH_RESULT_CAP
+
+# Most queued download logs written per transaction, so a burst can't hold the write lock for long
+DOWNLOAD_LOG_BATCH_SIZE = 256
+
+# Flush attempts a failed download log batch gets before it is dropped
+DOWNLOAD_LOG_MAX_ATTEMPTS = 5
+
+# How long /download reuses a file's metadata row before querying it again
+FILE_META_CACHE_TTL = 60
+
+# How long /stats results are reused before the aggregates are recomputed
+STATS_CACHE_TTL = 30
+
+async def open_db() -> aiosqlite.Connection:
+    """Open a database connection with the performance PRAGMAs applied"""
+    db = await aiosqlite.connect(BotConfig.DATABASE_NAME, iter_chunk_size=DB_ITER_CHUNK_SIZE)
+    for pragma in CONNECTION_PRAGMAS:
+        await db.execute(pragma)
+    return db
+
+class ConnectionPool:
+    """Fixed set of tuned connections handed out one command at a time"""
+
+    def __init__(self, size: int):
+        self.size = size
+        self._connections: List[aiosqlite.Connection] = []
+        self._idle: asyncio.Queue = asyncio.Queue()
+
+    async def open(self):
+        """Open every pooled connection up front"""
+        for _ in range(self.size):
+            db = await open_db()
+            self._connections.append(db)
+            self._idle.put_nowait(db)
+
+    @asynccontextmanager
+    async def connection(self):
+        """Borrow a connection; an unfinished transaction is rolled back before it is returned"""
+        db = await self._idle.get()
+        try:
+            yield db
+        finally:
+            if db.in_transaction:
+                await db.rollback()
+            self._idle.put_nowait(db)
+
+    async def close(self):
+        """Close all pooled connections"""
+        for db in self._connections:
+            await db.close()
+        self._connections.clear()
+
+def get_db():
+    """Borrow a connection from the bot's pool for the duration of an async with block"""
+    return bot.db_pool.connection()
+
+async def fetch_all(query: str, params: tuple = ()) -> list:
+    """Run a read query on its own pooled connection, so independent reads can be gathered"""
+    async with get_db() as db:
+        async with db.execute(query, params) as cursor:
+            return await cursor.fetchall()
+
+# Short-lived results shared by bursts of identical commands: key -> (computed at, value)
+_result_cache: Dict[str, Tuple[float, object]] = {}
+
+async def cached(key: str, ttl: float, fetch):
+    """Return fetch()'s result, reusing one computed within the last ttl seconds"""
+    now = time.monotonic()
+    entry = _result_cache.get(key)
+    if entry is not None and now - entry[0] < ttl:
+        return entry[1]
+    value = await fetch()
+    _result_cache[key] = (now, value)
+    return value
+
+class ResponseRing:
+    """Keeps the last few API responses and replays them in turn once a burst fills the ring"""
+
+    def __init__(self, size: int = 5, ttl: float = 30):
+        self.ttl = ttl
+        self._entries: deque = deque(maxlen=size)
+        self._next = 0
+
+    async def get(self, fetch):
+        """Fetch a fresh response until the ring is full, then rotate through the stored ones"""
+        now = time.monotonic()
+        while self._entries and now - self._entries[0][0] >= self.ttl:
+            self._entries.popleft()
+        if len(self._entries) < self._entries.maxlen:
+            value = await fetch()
+            if value is not None:
+                self._entries.append((now, value))
+            return value
+        self._next = (self._next + 1) % len(self._entries)
+        return self._entries[self._next][1]
+
+# Recently downloaded file rows, keyed by the requested ID: lowercase ID -> (fetched at, row)
+_file_meta_cache: Dict[str, Tuple[float, list]] = {}
+
+def get_cached_file_meta(file_id: str) -> Optional[list]:
+    """Return the cached /download row for this ID if it is younger than FILE_META_CACHE_TTL"""
+    entry = _file_meta_cache.get(file_id)
+    if entry is None:
+        return None
+    if time.monotonic() - entry[0] >= FILE_META_CACHE_TTL:
+        del _file_meta_cache[file_id]
+        return None
+    return entry[1]
+
+def forget_file_meta(full_file_id: Optional[str] = None):
+    """Drop cached rows for one file, or expired rows for every file when no ID is given"""
+    if full_file_id is None:
+        cutoff = time.monotonic() - FILE_META_CACHE_TTL
+        stale = [key for key, (fetched, _) in _file_meta_cache.items() if fetched < cutoff]
+    else:
+        stale = [key for key, (_, row) in _file_meta_cache.items() if row[0] == full_file_id]
+    for key in stale:
+        del _file_meta_cache[key]
+
+def bump_cached_download_count(row: list) -> int:
+    """Count a queued download in every cached /download row for the file and return the new count
+
+    Done synchronously when the log is queued, so concurrent downloads see successive counts
+    instead of each adding one to the same stale value.
+    """
+    rows = [row] + [cached_row for _, cached_row in _file_meta_cache.values() if cached_row[0] == row[0]]
+    count = max(cached_row[8] for cached_row in rows) + 1
+    for cached_row in rows:
+        cached_row[8] = count
+    return count
+
+async def fetch_capped(db: aiosqlite.Connection, query: str, params=(), cap: int = SEARCH_RESULT_CAP) -> list:
+    """Stream a query's rows, stopping once cap rows are buffered instead of fetching them all"""
+    rows = []
+    async with db.execute(query, params) as cursor:
+        async for row in cursor:
+            rows.append(row)
+            if len(rows) >= cap:
+                break
+    return rows
+
+# Characters stripped from admin-supplied file IDs (anything but ASCII letters, digits and -)
+_CLEAN_FILE_ID = re.compile(r'[^A-Za-z0-9-]')
+
+def file_id_prefix(file_id: str) -> Optional[int]:
+    """Integer value of the first 8 hex characters of a file ID, or None if they are not hex"""
+    head = file_id[:8].lower()
+    if len(head) < 8 or any(c not in '0123456789abcdef' for c in head):
+        return None
+    return int(head, 16)
+
+def file_id_range(file_id: str) -> Tuple[str, str]:
+    """Bounds of the file IDs starting with file_id, for a range scan of the files primary key
+
+    IDs are lowercase UUIDs, so the prefix is lowercased to keep LIKE's case-insensitive matching.
+    """
+    lower = file_id.lower()
+    return lower, lower + '\uffff'
+
+def file_id_filter(file_id: str) -> Tuple[str, tuple]:
+    """WHERE clause and params for a partial file ID lookup, using the id_prefix index when possible"""
+    prefix = file_id_prefix(file_id)
+    if prefix is None:
+        return "id >= ? AND id < ?", file_id_range(file_id)
+    return "id_prefix = ? AND id LIKE ?", (prefix, f"{file_id}%")
+
+def encode_course_code(course_code: str) -> Optional[int]:
+    """Pack a course code like SYSC2006 into an order-preserving integer, or None if it isn't one"""
+    if not BotConfig.validate_input('course_code', course_code):
+        return None
+    letters, number = course_code[:-4], int(course_code[-4:])
+    value = 0
+    for i in range(4):
+        # 5 bits per letter (A=1..Z=26); 3-letter codes pad with 0 so they sort first
+        value = value * 32 + (ord(letters[i]) - 64 if i < len(letters) else 0)
+    return value * 10000 + number
+
+def sha256_file(path: str) -> str:
+    """SHA-256 of a file, read in fixed-size chunks instead of all at once"""
+    with open(path, 'rb') as f:
+        if hasattr(hashlib, 'file_digest'):  # Python 3.11+
+            return hashlib.file_digest(f, 'sha256').hexdigest()
+        digest = hashlib.sha256()
+        while chunk := f.read(1 << 16):
+            digest.update(chunk)
+        return digest.hexdigest()
+
+def write_file_with_hash(data: bytes, path: str) -> str:
+    """Write bytes to path and return their SHA-256"""
+    with open(path, 'wb') as f:
+        f.write(data)
+    return hashlib.sha256(data).hexdigest()
+
+async def save_attachment_with_hash(attachment: discord.Attachment, path: str) -> str:
+    """Save an attachment to disk and return its SHA-256, removing the file if anything fails
+
+    The attachment is fetched through discord.py (size already checked against MAX_FILE_SIZE),
+    then written and hashed in a thread so the event loop never blocks on disk I/O.
+    """
+    try:
+        data = await attachment.read()
+        return await asyncio.to_thread(write_file_with_hash, data, path)
+    except BaseException:
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(path)
+        raise
+
+def coalesce_download_counts(entries: List[tuple]) -> Dict[str, List]:
+    """Combine queued download log rows into {file_id: [count, latest download time]}"""
+    counts: Dict[str, List] = {}
+    for file_id, _, _, _, download_date in entries:
+        update = counts.setdefault(file_id, [0, download_date])
+        update[0] += 1
+        update[1] = max(update[1], download_date)
+    return counts
+
+def remove_stale_pdfs(directory: str, cutoff: float) -> Tuple[List[str], List[Tuple[str, Exception]]]:
+    """Delete PDFs in directory last modified before cutoff; returns removed and failed names"""
+    removed, failed = [], []
+    try:
+        entries = os.scandir(directory)
+    except FileNotFoundError:
+        return removed, failed
+    with entries:
+        for entry in entries:
+            if not entry.name.endswith('.pdf'):
+                continue
+            try:
+                if entry.stat(follow_symlinks=False).st_mtime < cutoff:
+                    os.unlink(entry.path)
+                    removed.append(entry.name)
+            except OSError as e:
+                failed.append((entry.name, e))
+    return removed, failed
+
+def write_database_backup(source: str, backup_path: Path):
+    """Snapshot the database with SQLite's online backup API and gzip the result"""
+    snapshot_path = backup_path.with_suffix('')  # database_backup_X.db
+    src = sqlite3.connect(source)
+    dst = sqlite3.connect(snapshot_path)
+    try:
+        # Copy in small steps so concurrent writers are not starved
+        src.backup(dst, pages=256)
+    finally:
+        dst.close()
+        src.close()
+
+    try:
+        with open(snapshot_path, 'rb') as raw, gzip.open(backup_path, 'wb') as compressed:
+            shutil.copyfileobj(raw, compressed)
+    finally:
+        snapshot_path.unlink()
+
 class NoteSharingBot(commands.Bot):
     def __init__(self):
         intents = discord.Intents.default()
@@ -111,6 +403,28 @@ class NoteSharingBot(commands.Bot):
             description="Private Note Sharing Bot with PDF Watermarking"
         )
 
+        # Long-lived database connections, opened in setup_hook: a small pool for
+        # interactive commands, one for background tasks (WAL lets them run side by side)
+        self.db_pool = ConnectionPool(DB_POOL_SIZE)
+        self.background_db: Optional[aiosqlite.Connection] = None
+        self.background_db_lock = asyncio.Lock()
+
+        # Shared HTTP session for attachment downloads and the fun API commands, created in setup_hook
+        self.http_session: Optional[aiohttp.ClientSession] = None
+
+        # Worker processes for CPU-bound PDF watermarking, so downloads don't block the event loop
+        self.pdf_workers = WATERMARK_WORKERS
+        self.pdf_pool = concurrent.futures.ProcessPoolExecutor(max_workers=self.pdf_workers, initializer=warm_up_worker)
+
+        # Download log rows waiting to be written in one batch by flush_download_logs
+        self.download_log_queue: asyncio.Queue = asyncio.Queue()
+        # Batch whose write failed, kept for the next flush along with its attempt count
+        self.pending_download_logs: List[tuple] = []
+        self.pending_download_log_attempts = 0
+
+        # Whether /search can use the files_fts trigram index (set by init_database)
+        self.fts_enabled = False
+
         # Create necessary directories
         self.setup_directories()
 
@@ -125,35 +439,76 @@ class NoteSharingBot(commands.Bot):
         
         for directory in directories:
             Path(directory).mkdir(exist_ok=True)
-            logger.info(f"Created/verified directory: {directory}")
+            logger.info("Created/verified directory: %s", directory)
 
     async def setup_hook(self):
         """Initialize database, load cogs, and sync commands"""
+        # Start watermark workers now (before any database threads exist) rather than on the first downloads;
+        # the pool's initializer runs warm_up_worker in every worker as it starts, however tasks are distributed
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*(loop.run_in_executor(self.pdf_pool, os.getpid) for _ in range(self.pdf_workers)))
+
+        await self.db_pool.open()
         await self.init_database()
+        self.background_db = await open_db()
+        self.http_session = aiohttp.ClientSession(
+            timeout=aiohttp.ClientTimeout(total=120),
+            connector=aiohttp.TCPConnector(
+                limit=20,
+                ttl_dns_cache=300,
+                # Keep idle connections to the Discord CDN and the quote/advice APIs around between
+                # sporadic commands, so repeat calls skip the TCP and TLS handshakes
+                keepalive_timeout=60
+            )
+        )
         
         # Load extensions
         try:
             await self.load_extension("cogs.ai_chat")
             logger.info("Loaded extension: cogs.ai_chat")
         except Exception as e:
-            logger.error(f"Failed to load extension cogs.ai_chat: {e}")
+            logger.error("Failed to load extension cogs.ai_chat: %s", e)
 
         try:
             synced = await self.tree.sync()
-            logger.info(f"Synced {len(synced)} command(s)")
+            logger.info("Synced %d command(s)", len(synced))
         except Exception as e:
-            logger.error(f"Failed to sync commands: {e}")
+            logger.error("Failed to sync commands: %s", e)
         
         # Start background tasks
         self.cleanup_temp_files.start()
         self.backup_database.start()
         self.cleanup_old_logs.start()
+        self.flush_download_logs.start()
+
+    async def close(self):
+        """Close database connections and the HTTP session before shutting down"""
+        # Let an in-flight flush finish its batch (cancelling it mid-transaction would drop it),
+        # then write out any download logs still queued
+        self.flush_download_logs.stop()
+        flush_task = self.flush_download_logs.get_task()
+        if flush_task is not None and not flush_task.done():
+            with contextlib.suppress(Exception):
+                await flush_task
+        if self.background_db is not None:
+            await self.flush_download_logs()
+
+        await self.db_pool.close()
+        if self.background_db is not None:
+            await self.background_db.close()
+            self.background_db = None
+        if self.http_session is not None:
+            await self.http_session.close()
+            self.http_session = None
+        self.pdf_pool.shutdown(wait=False, cancel_futures=True)
+        await super().close()
 
     async def init_database(self):
         """Initialize SQLite database with required tables and indexes"""
-        async with aiosqlite.connect(BotConfig.DATABASE_NAME) as db:
-            # Enable foreign keys
-            await db.execute("PRAGMA foreign_keys = ON")
+        async with self.db_pool.connection() as db:
+            # page_size only takes effect before the first table is created (or after VACUUM)
+            await db.execute("PRAGMA page_size = 4096")
+            await db.execute("PRAGMA journal_mode = WAL")
             
             # Files table with enhanced schema
             await db.execute("""
@@ -171,10 +526,27 @@ class NoteSharingBot(commands.Bot):
                     file_hash TEXT,
                     is_active BOOLEAN DEFAULT 1,
                     download_count INTEGER DEFAULT 0,
-                    last_downloaded TIMESTAMP
+                    last_downloaded TIMESTAMP,
+                    id_prefix INTEGER,
+                    course_code_int INTEGER
                 )
             """)
 
+            # Older databases predate the derived integer lookup columns: add and backfill them
+            async with db.execute("PRAGMA table_info(files)") as cursor:
+                file_columns = {row[1] for row in await cursor.fetchall()}
+            for column in ('id_prefix', 'course_code_int'):
+                if column not in file_columns:
+                    await db.execute(f"ALTER TABLE files ADD COLUMN {column} INTEGER")
+            async with db.execute(
+                "SELECT id, course_code FROM files WHERE id_prefix IS NULL OR course_code_int IS NULL"
+            ) as cursor:
+                backfill = [
+                    (file_id_prefix(file_id), encode_course_code(course_code), file_id)
+                    for file_id, course_code in await cursor.fetchall()
+                ]
+            await db.executemany("UPDATE files SET id_prefix = ?, course_code_int = ? WHERE id = ?", backfill)
+
             # Download logs table with enhanced tracking
             await db.execute("""
                 CREATE TABLE IF NOT EXISTS download_logs (
@@ -204,67 +576,151 @@ class NoteSharingBot(commands.Bot):
                 )
             """)
 
-            # Rate limiting table for persistent rate limiting
+            # Rate limiting table for persistent rate limiting (one row per user/action, no rowid btree).
+            # Nothing writes to it yet, so an older rowid layout is simply recreated.
+            async with db.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'rate_limits'") as cursor:
+                row = await cursor.fetchone()
+            if row and 'WITHOUT ROWID' not in row[0]:
+                await db.execute("DROP TABLE rate_limits")
             await db.execute("""
                 CREATE TABLE IF NOT EXISTS rate_limits (
                     user_id INTEGER NOT NULL,
                     action_type TEXT NOT NULL,
                     action_count INTEGER DEFAULT 1,
                     window_start TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    PRIMARY KEY (user_id, action_type, window_start)
-                )
+                    PRIMARY KEY (user_id, action_type)
+                ) WITHOUT ROWID
             """)
 
-            # Create indexes for better performance
-            indexes = [
-                "CREATE INDEX IF NOT EXISTS idx_files_course ON files(course_code)",
-                "CREATE INDEX IF NOT EXISTS idx_files_uploader ON files(uploader_id)",
-                "CREATE INDEX IF NOT EXISTS idx_files_active ON files(is_active)",
-                "CREATE INDEX IF NOT EXISTS idx_files_upload_date ON files(upload_date)",
-                "CREATE INDEX IF NOT EXISTS idx_downloads_date ON download_logs(download_date)",
-                "CREATE INDEX IF NOT EXISTS idx_downloads_file ON download_logs(file_id)",
-                "CREATE INDEX IF NOT EXISTS idx_downloads_user ON download_logs(downloader_id)",
-                "CREATE INDEX IF NOT EXISTS idx_admin_logs_date ON admin_logs(action_date)",
-                "CREATE INDEX IF NOT EXISTS idx_admin_logs_admin ON admin_logs(admin_id)",
-                "CREATE INDEX IF NOT EXISTS idx_rate_limits_user ON rate_limits(user_id)"
-            ]
-            
-            for index_sql in indexes:
-                await db.execute(index_sql)
-
-            await db.commit()
-            logger.info("Database initialized successfully with indexes")
+            # Per-user active file counter, checked on upload instead of COUNT(*) over files.
+            # Rebuilt from files at startup so it can never drift.
+            await db.execute("""
+                CREATE TABLE IF NOT EXISTS user_stats (
+                    user_id INTEGER PRIMARY KEY,
+                    active_files INTEGER NOT NULL DEFAULT 0
+                )
+            """)
+            await db.execute("DELETE FROM user_stats")
+            await db.execute("""
+                INSERT INTO user_stats (user_id, active_files)
+                SELECT uploader_id, COUNT(*) FROM files WHERE is_active = 1 GROUP BY uploader_id
+            """)
 
-            # Create table for course reviews (for migrated commands)
-            await db.execute(
-                """
+            # Full-text index over the searchable file fields, kept in sync by triggers.
+            # The trigram tokenizer needs SQLite 3.34+ built with FTS5; without it /search keeps using LIKE
+            try:
+                await db.execute("CREATE VIRTUAL TABLE temp.fts_probe USING fts5(a, tokenize='trigram')")
+                await db.execute("DROP TABLE temp.fts_probe")
+                fts_supported = True
+            except sqlite3.OperationalError as e:
+                logger.warning("FTS5 trigram search unavailable (SQLite %s): %s; /search will use LIKE", sqlite3.sqlite_version, e)
+                fts_supported = False
+
+            if fts_supported:
+                async with db.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'files_fts'") as cursor:
+                    fts_exists = await cursor.fetchone() is not None
+                await db.execute("""
+                    CREATE VIRTUAL TABLE IF NOT EXISTS files_fts USING fts5(
+                        course_code, lecture_number, note_taker, original_filename,
+                        content='files', content_rowid='rowid', tokenize='trigram'
+                    )
+                """)
+                await db.executescript("""
+                    CREATE TRIGGER IF NOT EXISTS files_fts_insert AFTER INSERT ON files BEGIN
+                        INSERT INTO files_fts (rowid, course_code, lecture_number, note_taker, original_filename)
+                        VALUES (new.rowid, new.course_code, new.lecture_number, new.note_taker, new.original_filename);
+                    END;
+                    CREATE TRIGGER IF NOT EXISTS files_fts_delete AFTER DELETE ON files BEGIN
+                        INSERT INTO files_fts (files_fts, rowid, course_code, lecture_number, note_taker, original_filename)
+                        VALUES ('delete', old.rowid, old.course_code, old.lecture_number, old.note_taker, old.original_filename);
+                    END;
+                    CREATE TRIGGER IF NOT EXISTS files_fts_update
+                    AFTER UPDATE OF course_code, lecture_number, note_taker, original_filename ON files BEGIN
+                        INSERT INTO files_fts (files_fts, rowid, course_code, lecture_number, note_taker, original_filename)
+                        VALUES ('delete', old.rowid, old.course_code, old.lecture_number, old.note_taker, old.original_filename);
+                        INSERT INTO files_fts (rowid, course_code, lecture_number, note_taker, original_filename)
+                        VALUES (new.rowid, new.course_code, new.lecture_number, new.note_taker, new.original_filename);
+                    END;
+                """)
+                if fts_exists:
+                    # files has a TEXT primary key, so its rowids may be renumbered by a manual VACUUM;
+                    # that leaves files_fts pointing at the wrong rows, so verify it and rebuild if needed
+                    try:
+                        await db.execute("INSERT INTO files_fts (files_fts, rank) VALUES ('integrity-check', 1)")
+                    except sqlite3.DatabaseError:
+                        logger.warning("files_fts is out of sync with files (VACUUM?), rebuilding it")
+                        fts_exists = False
+                if not fts_exists:
+                    await db.execute("INSERT INTO files_fts (files_fts) VALUES ('rebuild')")
+                self.fts_enabled = True
+            else:
+                # A database copied from a build with FTS5 would otherwise fail every write to files
+                await db.executescript("""
+                    DROP TRIGGER IF EXISTS files_fts_insert;
+                    DROP TRIGGER IF EXISTS files_fts_delete;
+                    DROP TRIGGER IF EXISTS files_fts_update;
+                """)
+
+            # Schema tail as one script in one transaction: drop the indexes superseded by the
+            # partial/composite ones, create the current index set and the course reviews table
+            await db.executescript("""
+                BEGIN;
+
+                DROP INDEX IF EXISTS idx_files_active;
+                DROP INDEX IF EXISTS idx_files_upload_date;
+                DROP INDEX IF EXISTS idx_files_course_active;
+                DROP INDEX IF EXISTS idx_downloads_file;
+                DROP INDEX IF EXISTS idx_rate_limits_user;
+
+                -- Create indexes for better performance
+                CREATE INDEX IF NOT EXISTS idx_files_course ON files(course_code);
+                CREATE INDEX IF NOT EXISTS idx_files_uploader ON files(uploader_id);
+                CREATE INDEX IF NOT EXISTS idx_files_active_uploader ON files(uploader_username) WHERE is_active = 1;
+                CREATE INDEX IF NOT EXISTS idx_files_prefix ON files(id_prefix) WHERE is_active = 1;
+                CREATE INDEX IF NOT EXISTS idx_files_active_course_int ON files(course_code_int, lecture_number, upload_date DESC) WHERE is_active = 1;
+                CREATE INDEX IF NOT EXISTS idx_files_active_course ON files(course_code, lecture_number, upload_date DESC, note_taker) WHERE is_active = 1;
+                CREATE INDEX IF NOT EXISTS idx_files_active_downloads ON files(download_count DESC) WHERE is_active = 1;
+                CREATE INDEX IF NOT EXISTS idx_downloads_date ON download_logs(download_date);
+                CREATE INDEX IF NOT EXISTS idx_downloads_file_date ON download_logs(file_id, download_date DESC);
+                CREATE INDEX IF NOT EXISTS idx_downloads_user ON download_logs(downloader_id);
+                CREATE INDEX IF NOT EXISTS idx_admin_logs_date ON admin_logs(action_date);
+                CREATE INDEX IF NOT EXISTS idx_admin_logs_admin ON admin_logs(admin_id);
+
+                -- Course reviews (for migrated commands)
                 CREATE TABLE IF NOT EXISTS course_reviews (
                     id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    course_code TEXT NOT NULL,
+                    course_code TEXT NOT NULL COLLATE NOCASE,
                     user_id TEXT NOT NULL,
                     review TEXT NOT NULL,
-                    timestamp TEXT NOT NULL
-                )
-                """
-            )
+                    timestamp TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+                );
+                CREATE INDEX IF NOT EXISTS idx_course_reviews_course ON course_reviews(course_code);
+
+                COMMIT;
+            """)
+            logger.info("Database initialized successfully with indexes")
+
+            # Refresh planner statistics once every table and index exists
+            await db.execute("ANALYZE")
             await db.commit()
 
     @tasks.loop(hours=1)
     async def cleanup_temp_files(self):
         """Clean up temporary files"""
+        # Reclaim rate-limit entries for users who have been idle for the whole window
+        RateLimiter.cleanup_expired()
+        # Drop expired /download metadata rows that were never looked up again
+        forget_file_meta()
+
         if not BotConfig.CLEANUP_TEMP_FILES:
             return
             
-        temp_dir = Path(BotConfig.WATERMARKED_DIR)
-        if temp_dir.exists():
-            for file in temp_dir.glob("*.pdf"):
-                # Delete files older than 1 hour
-                if file.stat().st_mtime < time.time() - 3600:
-                    try:
-                        file.unlink()
-                        logger.info(f"Cleaned up temp file: {file.name}")
-                    except Exception as e:
-                        logger.warning(f"Could not delete temp file {file.name}: {e}")
+        # Delete files older than 1 hour; the directory walk runs off the event loop
+        removed, failed = await asyncio.to_thread(remove_stale_pdfs, BotConfig.WATERMARKED_DIR, time.time() - 3600)
+        for name in removed:
+            logger.info("Cleaned up temp file: %s", name)
+        for name, e in failed:
+            logger.warning("Could not delete temp file %s: %s", name, e)
 
     @cleanup_temp_files.before_loop
     async def before_cleanup_temp_files(self):
@@ -278,19 +734,19 @@ class NoteSharingBot(commands.Bot):
             backup_dir.mkdir(exist_ok=True)
             
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            backup_path = backup_dir / f"database_backup_{timestamp}.db"
+            backup_path = backup_dir / f"database_backup_{timestamp}.db.gz"
             
-            shutil.copy2(BotConfig.DATABASE_NAME, backup_path)
-            logger.info(f"Database backup created: {backup_path}")
+            await asyncio.to_thread(write_database_backup, BotConfig.DATABASE_NAME, backup_path)
+            logger.info("Database backup created: %s", backup_path)
             
-            # Keep only last 7 backups
-            backups = sorted(backup_dir.glob("database_backup_*.db"))
+            # Keep only last 7 backups (older uncompressed .db backups included)
+            backups = sorted(backup_dir.glob("database_backup_*.db*"))
             for old_backup in backups[:-7]:
                 old_backup.unlink()
-                logger.info(f"Removed old backup: {old_backup.name}")
+                logger.info("Removed old backup: %s", old_backup.name)
                 
         except Exception as e:
-            logger.error(f"Database backup failed: {e}")
+            logger.error("Database backup failed: %s", e)
 
     @backup_database.before_loop
     async def before_backup_database(self):
@@ -299,133 +755,101 @@ class NoteSharingBot(commands.Bot):
     @tasks.loop(hours=24)
     async def cleanup_old_logs(self):
         """Clean up old log entries"""
-        try:
-            async with aiosqlite.connect(BotConfig.DATABASE_NAME) as db:
-                # Clean up download logs older than configured days
-                cutoff_date = datetime.now() - timedelta(days=BotConfig.DATABASE_CLEANUP_DAYS)
+        db = self.background_db
+        async with self.background_db_lock:
+            try:
+                # Clean up download and admin logs older than configured days in one transaction;
+                # SQLite computes the cutoff in the same UTC format the timestamps are stored in
+                cutoff_modifier = f"-{BotConfig.DATABASE_CLEANUP_DAYS} days"
+                await db.execute("BEGIN IMMEDIATE")
                 await db.execute(
-                    "DELETE FROM download_logs WHERE download_date < ?",
-                    (cutoff_date.isoformat(),)
+                    "DELETE FROM download_logs WHERE download_date < datetime('now', ?)",
+                    (cutoff_modifier,)
                 )
                 await db.execute(
-                    "DELETE FROM admin_logs WHERE action_date < ?",
-                    (cutoff_date.isoformat(),)
+                    "DELETE FROM admin_logs WHERE action_date < datetime('now', ?)",
+                    (cutoff_modifier,)
                 )
                 await db.commit()
-                logger.info(f"Cleaned up logs older than {BotConfig.DATABASE_CLEANUP_DAYS} days")
-        except Exception as e:
-            logger.error(f"Log cleanup failed: {e}")
+                logger.info("Cleaned up logs older than %s days", BotConfig.DATABASE_CLEANUP_DAYS)
+            except Exception as e:
+                await db.rollback()
+                logger.error("Log cleanup failed: %s", e)
 
     @cleanup_old_logs.before_loop
     async def before_cleanup_old_logs(self):
         await self.wait_until_ready()
 
-    def generate_watermark_pdf(self, text: str, page_width: float, page_height: float, download_id: str = None) -> io.BytesIO:
-        """Generate an enhanced watermark PDF with multiple security layers"""
-        packet = io.BytesIO()
-
-        # Create canvas
-        c = canvas.Canvas(packet, pagesize=(page_width, page_height))
-
-        # Get watermark color from config
-        watermark_color = BotConfig.get_watermark_color()
-
-        # Set transparency
-        c.setFillAlpha(BotConfig.WATERMARK_OPACITY)
-
-        # Set font for diagonal watermark
-        c.setFont("Helvetica-Bold", BotConfig.WATERMARK_FONT_SIZE)
-
-        # Calculate diagonal angle and position
-        diagonal_angle = math.atan2(page_height, page_width) * 180 / math.pi
-
-        # Multiple watermarks across the page (enhanced grid)
-        step_x = page_width / 4  # More dense coverage
-        step_y = page_height / 5
-
-        for x_offset in range(0, int(page_width), int(step_x)):
-            for y_offset in range(0, int(page_height), int(step_y)):
-                c.saveState()
-                c.translate(x_offset + step_x/2, y_offset + step_y/2)
-                c.rotate(diagonal_angle)
-                c.setFillColor(Color(watermark_color[0], watermark_color[1], watermark_color[2], alpha=BotConfig.WATERMARK_OPACITY))
-                
-                # Add multiple watermark text variations
-                watermark_texts = [
-                    text,
-                    f"{text} - {datetime.now().strftime('%Y%m%d')}",
-                    f"Downloaded: {text}"
-                ]
-                
-                for i, wm_text in enumerate(watermark_texts):
-                    c.drawCentredString(0, 10 + (i * 15), wm_text)
-                
-                c.restoreState()
-
-        # Add corner watermarks with enhanced information
-        c.saveState()
-        c.setFont("Helvetica", BotConfig.WATERMARK_SMALL_FONT_SIZE)
-        c.setFillAlpha(0.6)
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        
-        # Bottom left corner
-        c.drawString(30, 30, f"Downloaded by: {text}")
-        c.drawString(30, 15, f"Date: {timestamp}")
-        
-        # Top right corner (if there's space)
-        if page_width > 200:
-            c.drawString(page_width - 200, page_height - 20, f"ID: {download_id[:8] if download_id else 'N/A'}")
-        
-        # Add invisible watermark for tamper detection
-        if download_id:
-            c.setFillAlpha(0.1)  # Very transparent
-            c.setFont("Helvetica", 8)
-            c.drawString(page_width - 100, 10, f"SEC:{hashlib.md5(download_id.encode()).hexdigest()[:8]}")
-        
-        c.restoreState()
-
-        c.save()
-        packet.seek(0)
-        return packet
-
-    async def apply_watermark_to_pdf(self, original_pdf_path: str, downloader_username: str) -> io.BytesIO:
-        """Apply watermark to all pages of a PDF"""
+    @tasks.loop(seconds=0.2)
+    async def flush_download_logs(self):
+        """Write queued download logs and counter updates, at most DOWNLOAD_LOG_BATCH_SIZE per transaction"""
+        while self.pending_download_logs or not self.download_log_queue.empty():
+            if not self.pending_download_logs:
+                entries = []
+                while len(entries) < DOWNLOAD_LOG_BATCH_SIZE and not self.download_log_queue.empty():
+                    entries.append(self.download_log_queue.get_nowait())
+                self.pending_download_logs = entries
+                self.pending_download_log_attempts = 0
+
+            # The batch stays pending until it is committed, so a failed or cancelled write is retried
+            if await self.write_download_logs(self.pending_download_logs):
+                self.pending_download_logs = []
+                continue
+
+            self.pending_download_log_attempts += 1
+            if self.pending_download_log_attempts >= DOWNLOAD_LOG_MAX_ATTEMPTS:
+                logger.error("Dropping %d download log(s) after %d failed attempts; lost download_count increments: %s",
+                             len(self.pending_download_logs), self.pending_download_log_attempts,
+                             {file_id: count for file_id, (count, _) in coalesce_download_counts(self.pending_download_logs).items()})
+                self.pending_download_logs = []
+            return  # Retry on the next tick
+
+    async def write_download_logs(self, entries: List[tuple]) -> bool:
+        """Insert a batch of download logs and bump the matching file counters in one transaction
+
+        Returns whether the batch was committed.
+        """
+        db = self.background_db
+        async with self.background_db_lock:
+            try:
+                await db.execute("BEGIN IMMEDIATE")
+                await db.executemany("""
+                    INSERT INTO download_logs (file_id, downloader_id, downloader_username, download_source, download_date)
+                    VALUES (?, ?, ?, ?, datetime(?, 'unixepoch'))
+                """, entries)
+
+                # Update download count and last downloaded timestamp, one UPDATE per distinct file.
+                # Recomputed from the raw entries on every attempt, so a retried batch never double counts
+                await db.executemany("""
+                    UPDATE files SET download_count = download_count + ?, last_downloaded = datetime(?, 'unixepoch')
+                    WHERE id = ?
+                """, [(count, last_date, file_id) for file_id, (count, last_date) in coalesce_download_counts(entries).items()])
+                await db.commit()
+                return True
+            except Exception as e:
+                await db.rollback()
+                logger.error("Failed to write %d download log(s): %s", len(entries), e)
+                return False
+            except BaseException:
+                # Cancelled mid-batch: don't leave the transaction open for the next flush
+                await db.rollback()
+                raise
+
+    async def apply_watermark_to_pdf(self, original_pdf_path: str, downloader_username: str) -> str:
+        """Apply watermark to all pages of a PDF in the worker process pool
+
+        Returns the path of a temporary copy in WATERMARKED_DIR; the caller removes it
+        once sent (cleanup_temp_files sweeps any that are left behind).
+        """
+        output_path = os.path.join(BotConfig.WATERMARKED_DIR, f"{uuid.uuid4()}.pdf")
+        loop = asyncio.get_running_loop()
         try:
-            # Read original PDF
-            with open(original_pdf_path, 'rb') as file:
-                pdf_reader = PdfReader(file)
-                pdf_writer = PdfWriter()
-
-                total_pages = len(pdf_reader.pages)
-                logger.info(f"Applying watermark to {total_pages} pages for user {downloader_username}")
-
-                for page_num, page in enumerate(pdf_reader.pages):
-                    # Get page dimensions
-                    page_width = float(page.mediabox.width)
-                    page_height = float(page.mediabox.height)
-
-                    # Generate watermark for this page
-                    watermark_packet = self.generate_watermark_pdf(
-                        downloader_username, page_width, page_height
-                    )
-
-                    # Create watermark page
-                    watermark_pdf = PdfReader(watermark_packet)
-                    watermark_page = watermark_pdf.pages[0]
-
-                    # Merge watermark with original page
-                    page.merge_page(watermark_page)
-                    pdf_writer.add_page(page)
-
-                # Write to BytesIO
-                output = io.BytesIO()
-                pdf_writer.write(output)
-                output.seek(0)
-                return output
-
-        except Exception as e:
-            logger.error(f"Error applying watermark: {e}")
+            await loop.run_in_executor(self.pdf_pool, watermark_pdf_file, original_pdf_path, downloader_username, output_path)
+        except BaseException:
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(output_path)
             raise
+        return output_path
 
     def sanitize_filename(self, text: str, max_length: int = 50) -> str:
         """Sanitize text for use in filenames"""
@@ -440,14 +864,15 @@ bot = NoteSharingBot()
 def validate_upload_inputs(course_code: str, lecture_number: str, note_taker: str) -> List[str]:
     """Validate upload inputs and return list of errors"""
     errors = []
+    validate_input = BotConfig.validate_input
     
-    if not BotConfig.validate_input('course_code', course_code):
+    if not validate_input('course_code', course_code):
         errors.append("Course code must be in format like SYSC2006 (3-4 letters + 4 numbers)")
     
-    if not BotConfig.validate_input('lecture_number', lecture_number):
+    if not validate_input('lecture_number', lecture_number):
         errors.append("Lecture number can only contain letters, numbers, hyphens, and underscores (max 10 chars)")
     
-    if not BotConfig.validate_input('note_taker', note_taker):
+    if not validate_input('note_taker', note_taker):
         errors.append("Note taker can only contain letters, numbers, hyphens, and underscores (max 30 chars)")
     
     return errors
@@ -485,7 +910,7 @@ async def upload_file(
             return
 
         # Validate file type
-        if not any(file.filename.lower().endswith(ext) for ext in BotConfig.ALLOWED_EXTENSIONS):
+        if not file.filename.lower().endswith(BotConfig.ALLOWED_EXTENSIONS):
             await interaction.followup.send(
                 f"❌ Only {', '.join(BotConfig.ALLOWED_EXTENSIONS)} files are allowed!", 
                 ephemeral=True
@@ -508,13 +933,14 @@ async def upload_file(
             await interaction.followup.send(error_msg, ephemeral=True)
             return
 
-        # Check user file limit
-        async with aiosqlite.connect(BotConfig.DATABASE_NAME) as db:
+        # Check user file limit (denormalized counter, one primary key lookup)
+        async with get_db() as db:
             async with db.execute(
-                "SELECT COUNT(*) FROM files WHERE uploader_id = ? AND is_active = 1", 
+                "SELECT active_files FROM user_stats WHERE user_id = ?", 
                 (interaction.user.id,)
             ) as cursor:
-                user_file_count = (await cursor.fetchone())[0]
+                row = await cursor.fetchone()
+        user_file_count = row[0] if row else 0
         
         if user_file_count >= BotConfig.MAX_FILES_PER_USER:
             await interaction.followup.send(
@@ -534,29 +960,53 @@ async def upload_file(
         new_filename = f"{safe_course}-{safe_lecture}-{safe_taker}.pdf"
         file_path = f"{BotConfig.FILES_DIR}/{file_id}.pdf"
 
-        # Download and save file
-        await file.save(file_path)
+        # Download and save file, hashing it for integrity checking as it is written
+        file_hash = await save_attachment_with_hash(file, file_path)
 
-        # Calculate file hash for integrity checking
-        file_hash = None
-        try:
-            with open(file_path, 'rb') as f:
-                file_hash = hashlib.sha256(f.read()).hexdigest()
-        except Exception as e:
-            logger.warning(f"Could not calculate file hash for {file_id}: {e}")
+        async with get_db() as db:
+            # Claim a slot in the user's file count; the guarded upsert returns no row once the
+            # limit is reached, so concurrent uploads cannot push a user past it
+            if SQLITE_HAS_RETURNING:
+                async with db.execute("""
+                    INSERT INTO user_stats (user_id, active_files) VALUES (?, 1)
+                    ON CONFLICT(user_id) DO UPDATE SET active_files = active_files + 1
+                    WHERE active_files < ?
+                    RETURNING active_files
+                """, (interaction.user.id, BotConfig.MAX_FILES_PER_USER)) as cursor:
+                    slot = await cursor.fetchone()
+            else:
+                # Same guard without RETURNING: the UPDATE only changes a row while under the limit
+                await db.execute(
+                    "INSERT OR IGNORE INTO user_stats (user_id, active_files) VALUES (?, 0)",
+                    (interaction.user.id,)
+                )
+                async with db.execute("""
+                    UPDATE user_stats SET active_files = active_files + 1
+                    WHERE user_id = ? AND active_files < ?
+                """, (interaction.user.id, BotConfig.MAX_FILES_PER_USER)) as cursor:
+                    slot = cursor.rowcount or None
+
+            if slot is not None:
+                # Store in database with enhanced tracking
+                await db.execute("""
+                    INSERT INTO files 
+                    (id, original_filename, course_code, lecture_number, note_taker, 
+                     uploader_id, uploader_username, file_size, file_path, file_hash, id_prefix, course_code_int)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """, (
+                    file_id, file.filename, course_code, lecture_number, 
+                    note_taker, interaction.user.id, interaction.user.name, file.size, file_path, file_hash,
+                    file_id_prefix(file_id), encode_course_code(course_code)
+                ))
+                await db.commit()
 
-        # Store in database with enhanced tracking
-        async with aiosqlite.connect(BotConfig.DATABASE_NAME) as db:
-            await db.execute("""
-                INSERT INTO files 
-                (id, original_filename, course_code, lecture_number, note_taker, 
-                 uploader_id, uploader_username, file_size, file_path, file_hash)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (
-                file_id, file.filename, course_code, lecture_number, 
-                note_taker, interaction.user.id, interaction.user.name, file.size, file_path, file_hash
-            ))
-            await db.commit()
+        if slot is None:
+            os.remove(file_path)
+            await interaction.followup.send(
+                f"❌ You have reached the maximum limit of {BotConfig.MAX_FILES_PER_USER} files per user!", 
+                ephemeral=True
+            )
+            return
 
         # Success message
         embed = discord.Embed(
@@ -569,34 +1019,53 @@ async def upload_file(
         embed.set_footer(text=f"File ID: {file_id[:8]} | Use this ID to download")
 
         await interaction.followup.send(embed=embed)
-        logger.info(f"File uploaded: {new_filename} by {interaction.user} ({interaction.user.id})")
+        logger.info("File uploaded: %s by %s (%s)", new_filename, interaction.user, interaction.user.id)
 
     except Exception as e:
-        logger.error(f"Upload error for user {interaction.user}: {e}")
+        logger.error("Upload error for user %s: %s", interaction.user, e)
         await interaction.followup.send("❌ An error occurred during upload. Please try again.", ephemeral=True)
 
 # Browse files command with pagination
 class BrowseView(discord.ui.View):
-    def __init__(self, files: List, per_page: int = 5):
+    def __init__(self, files: List, per_page: int = 5, total: Optional[int] = None):
         super().__init__(timeout=300)
         self.files = files
         self.per_page = per_page
+        self.total = len(files) if total is None else total
         self.current_page = 0
-        self.max_page = (len(files) - 1) // per_page
+        self.max_page = (self.total - 1) // per_page
+        # Rendered page embeds, so flipping back to a visited page skips loading and rendering it again
+        self.page_embeds: Dict[int, discord.Embed] = {}
 
-    def get_embed(self):
+    async def load_page(self):
+        """Make the current page's rows available to get_embed (a fixed list is already in memory)"""
+
+    def page_rows(self) -> List:
         start_idx = self.current_page * self.per_page
-        end_idx = start_idx + self.per_page
-        current_files = self.files[start_idx:end_idx]
+        return self.files[start_idx:start_idx + self.per_page]
+
+    def get_embed(self):
+        embed = self.page_embeds.get(self.current_page)
+        if embed is None:
+            embed = self.page_embeds[self.current_page] = self.render_page()
+
+        # Update button states
+        self.previous_button.disabled = self.current_page == 0
+        self.next_button.disabled = self.current_page == self.max_page
+
+        return embed
+
+    def render_page(self) -> discord.Embed:
+        current_files = self.page_rows()
 
         embed = discord.Embed(
             title="📚 Available Notes",
             color=discord.Color.blue(),
-            description=f"Page {self.current_page + 1}/{self.max_page + 1} | Total: {len(self.files)} files"
+            description=f"Page {self.current_page + 1}/{self.max_page + 1} | Total: {self.total} files"
         )
 
         for file_data in current_files:
-            file_id, original_name, course, lecture, taker, uploader_id, uploader_name, upload_date, size, path, file_hash, is_active, download_count, last_downloaded = file_data
+            file_id, course, lecture, taker, uploader_name, upload_date, size = file_data
 
             size_kb = size / 1024 if size else 0
             upload_date_formatted = upload_date[:10] if upload_date else "Unknown"
@@ -607,23 +1076,44 @@ class BrowseView(discord.ui.View):
                 inline=True
             )
 
-        # Update button states
-        self.previous_button.disabled = self.current_page == 0
-        self.next_button.disabled = self.current_page == self.max_page
-
         return embed
 
+    async def show_page(self, interaction: discord.Interaction):
+        """Redraw the message for the current page, loading its rows only on the first visit"""
+        if self.current_page not in self.page_embeds:
+            await self.load_page()
+        await interaction.response.edit_message(embed=self.get_embed(), view=self)
+
     @discord.ui.button(label='◀️ Previous', style=discord.ButtonStyle.primary)
     async def previous_button(self, interaction: discord.Interaction, button: discord.ui.Button):
         if self.current_page > 0:
             self.current_page -= 1
-        await interaction.response.edit_message(embed=self.get_embed(), view=self)
+        await self.show_page(interaction)
 
     @discord.ui.button(label='Next ▶️', style=discord.ButtonStyle.primary)
     async def next_button(self, interaction: discord.Interaction, button: discord.ui.Button):
         if self.current_page < self.max_page:
             self.current_page += 1
-        await interaction.response.edit_message(embed=self.get_embed(), view=self)
+        await self.show_page(interaction)
+
+class QueryBrowseView(BrowseView):
+    """Pages through a query with LIMIT/OFFSET, fetching only the rows of the page being shown"""
+
+    def __init__(self, query: str, params: List, first_page: List, total: int, per_page: int = 5):
+        super().__init__(first_page, per_page, total)
+        self.query = query
+        self.params = params
+
+    async def load_page(self):
+        async with get_db() as db:
+            async with db.execute(
+                self.query + " LIMIT ? OFFSET ?",
+                [*self.params, self.per_page, self.current_page * self.per_page]
+            ) as cursor:
+                self.files = await cursor.fetchall()
+
+    def page_rows(self) -> List:
+        return self.files
 
 @bot.tree.command(name="browse", description="Browse available notes")
 @app_commands.describe(
@@ -642,36 +1132,55 @@ async def browse_files(
         pass
 
     try:
-        # Build query
-        query = "SELECT * FROM files WHERE is_active = 1"
+        # Build query (prefix matches only, so idx_files_active_course can be used)
+        query = " FROM files WHERE is_active = 1"
         params = []
 
-        if course_code:
-            query += " AND course_code LIKE ?"
-            params.append(f"%{course_code}%")
+        # Course codes are stored uppercase; normalise the filter once
+        course_code = course_code.upper() if course_code else None
+        course_code_int = encode_course_code(course_code) if course_code else None
+        if course_code_int is not None:
+            # A complete course code is an integer equality match
+            query += " AND course_code_int = ?"
+            params.append(course_code_int)
+        elif course_code:
+            # A prefix range keeps the match on the index
+            query += " AND course_code >= ? AND course_code < ?"
+            params.extend([course_code, course_code[:-1] + chr(ord(course_code[-1]) + 1)])
 
         if note_taker:
-            query += " AND note_taker LIKE ?"
-            params.append(f"%{note_taker}%")
+            query += " AND note_taker LIKE ? ESCAPE '\\'"
+            escaped = note_taker.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+            params.append(f"{escaped}%")
 
-        query += " ORDER BY course_code, lecture_number, upload_date DESC"
+        if course_code_int is not None:
+            # Single course: ordering by course_code is redundant and would defeat the index order
+            order_by = " ORDER BY lecture_number, upload_date DESC"
+        else:
+            order_by = " ORDER BY course_code, lecture_number, upload_date DESC"
 
-        async with aiosqlite.connect(BotConfig.DATABASE_NAME) as db:
-            async with db.execute(query, params) as cursor:
-                files = await cursor.fetchall()
+        # Count the matches, then page through them instead of loading every row up front
+        async with get_db() as db:
+            async with db.execute("SELECT COUNT(*)" + query, params) as cursor:
+                total = (await cursor.fetchone())[0]
 
-        if not files:
+        if not total:
             await interaction.followup.send("📝 No files found matching your criteria.")
             return
 
         # Use pagination view
-        view = BrowseView(files)
+        page_query = (
+            "SELECT id, course_code, lecture_number, note_taker, uploader_username, upload_date, file_size"
+            + query + order_by
+        )
+        view = QueryBrowseView(page_query, params, [], total)
+        await view.load_page()
         embed = view.get_embed()
 
         await interaction.followup.send(embed=embed, view=view)
 
     except Exception as e:
-        logger.error(f"Browse error for user {interaction.user}: {e}")
+        logger.error("Browse error for user %s: %s", interaction.user, e)
         await interaction.followup.send("❌ An error occurred while browsing files.", ephemeral=True)
 
 # Download file command with enhanced security and rate limiting
@@ -703,29 +1212,38 @@ async def download_file(interaction: discord.Interaction, file_id: str):
             )
             return
 
-        # Find file by partial ID
-        async with aiosqlite.connect(BotConfig.DATABASE_NAME) as db:
-            async with db.execute(
-                "SELECT * FROM files WHERE id LIKE ? AND is_active = 1", 
-                (f"{file_id}%",)
-            ) as cursor:
-                files = await cursor.fetchall()
+        # Find file by partial ID, reusing the row from a recent download of the same ID
+        cache_key = file_id.lower()
+        file_data = get_cached_file_meta(cache_key)
+        if file_data is None:
+            async with get_db() as db:
+                id_clause, id_params = file_id_filter(file_id)
+                async with db.execute(
+                    f"""
+                    SELECT id, course_code, lecture_number, note_taker, uploader_username,
+                           upload_date, file_path, file_hash, download_count
+                    FROM files WHERE {id_clause} AND is_active = 1
+                    """,
+                    id_params
+                ) as cursor:
+                    files = await cursor.fetchall()
 
-        if not files:
-            await interaction.followup.send("❌ File not found! Please check the file ID.", ephemeral=True)
-            return
+            if not files:
+                await interaction.followup.send("❌ File not found! Please check the file ID.", ephemeral=True)
+                return
 
-        if len(files) > 1:
-            file_list = "\n".join([f"`{f[0][:8]}` - {f[2]}-{f[3]}-{f[4]}" for f in files[:5]])
-            await interaction.followup.send(
-                f"❌ Multiple files found with that ID. Please be more specific:\n{file_list}",
-                ephemeral=True
-            )
-            return
+            if len(files) > 1:
+                file_list = "\n".join([f"`{f[0][:8]}` - {f[1]}-{f[2]}-{f[3]}" for f in files[:5]])
+                await interaction.followup.send(
+                    f"❌ Multiple files found with that ID. Please be more specific:\n{file_list}",
+                    ephemeral=True
+                )
+                return
+
+            file_data = list(files[0])
+            _file_meta_cache[cache_key] = (time.monotonic(), file_data)
 
-        file_data = files[0]
-        # Handle the correct schema with all 14 fields
-        full_file_id, original_name, course, lecture, taker, uploader_id, uploader_name, upload_date, size, file_path, file_hash, is_active, download_count, last_downloaded = file_data
+        full_file_id, course, lecture, taker, uploader_name, upload_date, file_path, file_hash, _ = file_data
 
         # Check if file exists
         if not os.path.exists(file_path):
@@ -735,20 +1253,19 @@ async def download_file(interaction: discord.Interaction, file_id: str):
         # Verify file integrity if hash exists
         if file_hash:
             try:
-                with open(file_path, 'rb') as f:
-                    current_hash = hashlib.sha256(f.read()).hexdigest()
+                current_hash = await asyncio.to_thread(sha256_file, file_path)
                 if current_hash != file_hash:
-                    logger.warning(f"File integrity check failed for {full_file_id}")
+                    logger.warning("File integrity check failed for %s", full_file_id)
                     await interaction.followup.send("❌ File integrity check failed. Please contact an administrator.", ephemeral=True)
                     return
             except Exception as e:
-                logger.warning(f"Could not verify file hash for {full_file_id}: {e}")
+                logger.warning("Could not verify file hash for %s: %s", full_file_id, e)
 
         # Apply enhanced watermark
         try:
-            watermarked_pdf = await bot.apply_watermark_to_pdf(file_path, interaction.user.name)
+            watermarked_path = await bot.apply_watermark_to_pdf(file_path, interaction.user.name)
         except Exception as e:
-            logger.error(f"Watermark error for {full_file_id}: {e}")
+            logger.error("Watermark error for %s: %s", full_file_id, e)
             await interaction.followup.send("❌ Error processing file. Please try again.", ephemeral=True)
             return
 
@@ -758,44 +1275,39 @@ async def download_file(interaction: discord.Interaction, file_id: str):
         safe_taker = bot.sanitize_filename(taker, 20)
         final_filename = f"{safe_course}-{safe_lecture}-{safe_taker}_watermarked.pdf"
 
-        # Enhanced download logging
-        async with aiosqlite.connect(BotConfig.DATABASE_NAME) as db:
-            # Log download
-            await db.execute("""
-                INSERT INTO download_logs (file_id, downloader_id, downloader_username, download_source)
-                VALUES (?, ?, ?, ?)
-            """, (full_file_id, interaction.user.id, interaction.user.name, 'bot'))
-            
-            # Update download count and last downloaded timestamp
-            await db.execute("""
-                UPDATE files SET download_count = download_count + 1, last_downloaded = CURRENT_TIMESTAMP
-                WHERE id = ?
-            """, (full_file_id,))
-            
-            await db.commit()
+        # Log download (written in batches by flush_download_logs)
+        # Queued as a Unix time; SQLite formats it when the batch is written
+        bot.download_log_queue.put_nowait((full_file_id, interaction.user.id, interaction.user.name, 'bot', time.time()))
+        download_count = bump_cached_download_count(file_data)  # Keep cached rows in step with the queued log
 
-        # Send file
-        discord_file = discord.File(
-            watermarked_pdf, 
-            filename=final_filename,
-            description="Watermarked PDF note"
-        )
+        # Discord streams the upload from disk; the temporary copy is removed afterwards
+        try:
+            # Send file
+            discord_file = discord.File(
+                watermarked_path,
+                filename=final_filename,
+                description="Watermarked PDF note"
+            )
 
-        embed = discord.Embed(
-            title="📥 Download Ready",
-            color=discord.Color.green(),
-            description=f"**File:** {final_filename}\n**Course:** {course}\n**Lecture:** {lecture}\n**Note Taker:** {taker}"
-        )
-        embed.add_field(name="Original Uploader", value=uploader_name, inline=True)
-        embed.add_field(name="Upload Date", value=upload_date[:10], inline=True)
-        embed.add_field(name="Download Count", value=str(download_count + 1), inline=True)
-        embed.set_footer(text="⚠️ This file has been watermarked with your username and download timestamp.")
+            embed = discord.Embed(
+                title="📥 Download Ready",
+                color=discord.Color.green(),
+                description=f"**File:** {final_filename}\n**Course:** {course}\n**Lecture:** {lecture}\n**Note Taker:** {taker}"
+            )
+            embed.add_field(name="Original Uploader", value=uploader_name, inline=True)
+            embed.add_field(name="Upload Date", value=upload_date[:10], inline=True)
+            embed.add_field(name="Download Count", value=str(download_count), inline=True)
+            embed.set_footer(text="⚠️ This file has been watermarked with your username and download timestamp.")
+
+            await interaction.followup.send(embed=embed, file=discord_file, ephemeral=True)
+        finally:
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(watermarked_path)
 
-        await interaction.followup.send(embed=embed, file=discord_file, ephemeral=True)
-        logger.info(f"File downloaded: {final_filename} by {interaction.user} ({interaction.user.id})")
+        logger.info("File downloaded: %s by %s (%s)", final_filename, interaction.user, interaction.user.id)
 
     except Exception as e:
-        logger.error(f"Download error for user {interaction.user}: {e}")
+        logger.error("Download error for user %s: %s", interaction.user, e)
         await interaction.followup.send("❌ An error occurred during download. Please try again.", ephemeral=True)
 
 # Search command
@@ -805,11 +1317,22 @@ async def search_files(interaction: discord.Interaction, keyword: str):
     await interaction.response.defer()
 
     try:
-        search_term = f"%{keyword}%"
-
-        async with aiosqlite.connect(BotConfig.DATABASE_NAME) as db:
-            async with db.execute("""
-                SELECT * FROM files 
+        if len(keyword) >= 3 and bot.fts_enabled:
+            # Substring match through the trigram full-text index instead of four LIKE scans
+            query = """
+                SELECT f.id, f.course_code, f.lecture_number, f.note_taker, f.uploader_username, f.upload_date, f.file_size
+                FROM files_fts
+                JOIN files f ON f.rowid = files_fts.rowid
+                WHERE files_fts MATCH ? AND f.is_active = 1
+                ORDER BY f.course_code, f.lecture_number
+            """
+            params = ('"' + keyword.replace('"', '""') + '"',)
+        else:
+            # Trigrams need at least 3 characters (and FTS5 support); otherwise fall back to LIKE
+            search_term = f"%{keyword}%"
+            query = """
+                SELECT id, course_code, lecture_number, note_taker, uploader_username, upload_date, file_size
+                FROM files 
                 WHERE is_active = 1 AND (
                     course_code LIKE ? OR 
                     lecture_number LIKE ? OR 
@@ -817,8 +1340,11 @@ async def search_files(interaction: discord.Interaction, keyword: str):
                     original_filename LIKE ?
                 )
                 ORDER BY course_code, lecture_number
-            """, (search_term, search_term, search_term, search_term)) as cursor:
-                files = await cursor.fetchall()
+            """
+            params = (search_term, search_term, search_term, search_term)
+
+        async with get_db() as db:
+            files = await fetch_capped(db, query, params)
 
         if not files:
             await interaction.followup.send(f"🔍 No files found for keyword: **{keyword}**")
@@ -828,11 +1354,13 @@ async def search_files(interaction: discord.Interaction, keyword: str):
         view = BrowseView(files)
         embed = view.get_embed()
         embed.title = f"🔍 Search Results for: {keyword}"
+        if len(files) >= SEARCH_RESULT_CAP:
+            embed.set_footer(text=f"Showing the first {SEARCH_RESULT_CAP} matches; try a more specific keyword")
 
         await interaction.followup.send(embed=embed, view=view)
 
     except Exception as e:
-        logger.error(f"Search error for user {interaction.user}: {e}")
+        logger.error("Search error for user %s: %s", interaction.user, e)
         await interaction.followup.send("❌ An error occurred during search.", ephemeral=True)
 
 # Admin commands group with enhanced functionality
@@ -857,7 +1385,7 @@ class AdminCommands(commands.GroupCog, name="admin"):
 
     async def log_admin_action(self, admin_id: int, admin_username: str, action: str, target_file_id: str = None, details: str = None):
         """Log admin actions"""
-        async with aiosqlite.connect(BotConfig.DATABASE_NAME) as db:
+        async with get_db() as db:
             await db.execute("""
                 INSERT INTO admin_logs (admin_id, admin_username, action, target_file_id, details)
                 VALUES (?, ?, ?, ?, ?)
@@ -876,13 +1404,17 @@ class AdminCommands(commands.GroupCog, name="admin"):
         await interaction.response.defer()
 
         try:
-            clean_file_id = "".join(c for c in file_id if c.isalnum() or c == "-")[:36]
+            clean_file_id = _CLEAN_FILE_ID.sub('', file_id)[:36]
 
-            async with aiosqlite.connect(BotConfig.DATABASE_NAME) as db:
+            async with get_db() as db:
                 # Get file info
+                id_clause, id_params = file_id_filter(clean_file_id)
                 async with db.execute(
-                    "SELECT * FROM files WHERE id LIKE ? AND is_active = 1", 
-                    (f"{clean_file_id}%",)
+                    f"""
+                    SELECT id, course_code, lecture_number, note_taker, uploader_username, upload_date
+                    FROM files WHERE {id_clause} AND is_active = 1
+                    """,
+                    id_params
                 ) as cursor:
                     files = await cursor.fetchall()
 
@@ -891,7 +1423,7 @@ class AdminCommands(commands.GroupCog, name="admin"):
                     return
 
                 if len(files) > 1:
-                    file_list = "\n".join([f"`{f[0][:8]}` - {f[2]}-{f[3]}-{f[4]}" for f in files[:5]])
+                    file_list = "\n".join([f"`{f[0][:8]}` - {f[1]}-{f[2]}-{f[3]}" for f in files[:5]])
                     await interaction.followup.send(
                         f"❌ Multiple files found. Please be more specific:\n{file_list}",
                         ephemeral=True
@@ -899,49 +1431,39 @@ class AdminCommands(commands.GroupCog, name="admin"):
                     return
 
                 file_data = files[0]
-                # Align with current schema (14 columns)
-                (
-                    full_file_id,
-                    original_name,
-                    course,
-                    lecture,
-                    taker,
-                    uploader_id,
-                    uploader_name,
-                    upload_date,
-                    size,
-                    file_path,
-                    file_hash,
-                    is_active,
-                    download_count,
-                    last_downloaded,
-                ) = file_data
-
-                # Soft delete (mark as inactive)
-                await db.execute("UPDATE files SET is_active = 0 WHERE id = ?", (full_file_id,))
+                full_file_id, course, lecture, taker, uploader_name, upload_date = file_data
+
+                # Soft delete (mark as inactive) and release the uploader's file slot
+                cursor = await db.execute("UPDATE files SET is_active = 0 WHERE id = ? AND is_active = 1", (full_file_id,))
+                if cursor.rowcount:
+                    await db.execute("""
+                        UPDATE user_stats SET active_files = active_files - 1
+                        WHERE user_id = (SELECT uploader_id FROM files WHERE id = ?) AND active_files > 0
+                    """, (full_file_id,))
                 await db.commit()
+            forget_file_meta(full_file_id)
 
-                # Log admin action
-                await self.log_admin_action(
-                    interaction.user.id, 
-                    interaction.user.name, 
-                    "DELETE_FILE", 
-                    full_file_id,
-                    f"Deleted {course}-{lecture}-{taker}"
-                )
+            # Log admin action
+            await self.log_admin_action(
+                interaction.user.id, 
+                interaction.user.name, 
+                "DELETE_FILE", 
+                full_file_id,
+                f"Deleted {course}-{lecture}-{taker}"
+            )
 
-                embed = discord.Embed(
-                    title="✅ File Deleted",
-                    color=discord.Color.red(),
-                    description=f"**File:** {course}-{lecture}-{taker}\n**Uploader:** {uploader_name}\n**Upload Date:** {upload_date[:10]}"
-                )
-                embed.set_footer(text=f"Action performed by {interaction.user.name}")
+            embed = discord.Embed(
+                title="✅ File Deleted",
+                color=discord.Color.red(),
+                description=f"**File:** {course}-{lecture}-{taker}\n**Uploader:** {uploader_name}\n**Upload Date:** {upload_date[:10]}"
+            )
+            embed.set_footer(text=f"Action performed by {interaction.user.name}")
 
-                await interaction.followup.send(embed=embed)
-                logger.info(f"File soft-deleted by admin {interaction.user}: {full_file_id}")
+            await interaction.followup.send(embed=embed)
+            logger.info("File soft-deleted by admin %s: %s", interaction.user, full_file_id)
 
         except Exception as e:
-            logger.error(f"Delete error by admin {interaction.user}: {e}")
+            logger.error("Delete error by admin %s: %s", interaction.user, e)
             await interaction.followup.send("❌ An error occurred during deletion.", ephemeral=True)
 
     @app_commands.command(name="logs", description="View download logs (Admin only)")
@@ -960,48 +1482,48 @@ class AdminCommands(commands.GroupCog, name="admin"):
             limit = max(1, min(limit or 20, 50))
 
             query = """
-                SELECT dl.*, f.course_code, f.lecture_number, f.note_taker, f.uploader_username
+                SELECT dl.file_id, dl.downloader_username, dl.download_date,
+                       f.course_code, f.lecture_number, f.note_taker, f.uploader_username
                 FROM download_logs dl
                 JOIN files f ON dl.file_id = f.id
             """
             params = []
 
             if file_id:
-                clean_file_id = "".join(c for c in file_id if c.isalnum() or c == "-")[:36]
-                query += " WHERE f.id LIKE ?"
-                params.append(f"{clean_file_id}%")
+                clean_file_id = _CLEAN_FILE_ID.sub('', file_id)[:36]
+                # Range on the primary key: logs also cover deleted files, which idx_files_prefix skips
+                query += " WHERE f.id >= ? AND f.id < ?"
+                params.extend(file_id_range(clean_file_id))
 
-            query += f" ORDER BY dl.download_date DESC LIMIT {limit}"
+            # Bound rather than interpolated, so every limit shares one cached statement
+            query += " ORDER BY dl.download_date DESC LIMIT ?"
+            params.append(limit)
 
-            async with aiosqlite.connect(BotConfig.DATABASE_NAME) as db:
-                async with db.execute(query, params) as cursor:
-                    logs = await cursor.fetchall()
+            async with get_db() as db:
+                logs = await fetch_capped(db, query, params, cap=limit)
 
             if not logs:
                 await interaction.followup.send("📋 No download logs found.")
                 return
 
+            # One line per log in the description instead of an embed field each (max 15 shown)
+            log_lines = "\n".join(
+                f"**{course}-{lecture}-{taker}** · 👤 {username} · 📤 {uploader} · 📅 {download_date[:16]} · `{file_id_log[:8]}`"
+                for file_id_log, username, download_date, course, lecture, taker, uploader in logs[:15]
+            )
             embed = discord.Embed(
                 title="📋 Download Logs",
                 color=discord.Color.orange(),
-                description=f"Recent downloads ({len(logs)} entries)"
+                description=f"Recent downloads ({len(logs)} entries)\n\n{log_lines}"
             )
 
-            for log in logs[:15]:  # Show max 15 in embed
-                log_id, file_id_log, downloader_id, username, download_date, ip_hash, course, lecture, taker, uploader = log
-                embed.add_field(
-                    name=f"{course}-{lecture}-{taker}",
-                    value=f"👤 **Downloaded by:** {username}\n📤 **Uploader:** {uploader}\n📅 **Date:** {download_date[:16]}\n🆔 **File ID:** `{file_id_log[:8]}`",
-                    inline=True
-                )
-
             if len(logs) > 15:
                 embed.set_footer(text=f"Showing 15 of {len(logs)} logs")
 
             await interaction.followup.send(embed=embed)
 
         except Exception as e:
-            logger.error(f"Logs error by admin {interaction.user}: {e}")
+            logger.error("Logs error by admin %s: %s", interaction.user, e)
             await interaction.followup.send("❌ An error occurred while fetching logs.", ephemeral=True)
 
     @app_commands.command(name="stats", description="View bot statistics (Admin only)")
@@ -1015,38 +1537,33 @@ class AdminCommands(commands.GroupCog, name="admin"):
         await interaction.response.defer()
 
         try:
-            async with aiosqlite.connect(BotConfig.DATABASE_NAME) as db:
-                # Get file statistics
-                async with db.execute("SELECT COUNT(*) FROM files WHERE is_active = 1") as cursor:
-                    active_files = (await cursor.fetchone())[0]
-
-                async with db.execute("SELECT COUNT(*) FROM files WHERE is_active = 0") as cursor:
-                    deleted_files = (await cursor.fetchone())[0]
-
-                async with db.execute("SELECT COUNT(*) FROM download_logs") as cursor:
-                    total_downloads = (await cursor.fetchone())[0]
-
+            # File and download totals in one pass, with the two rankings running
+            # concurrently on their own pooled connections; reused for STATS_CACHE_TTL seconds
+            counts, top_uploaders, top_files = await cached("stats", STATS_CACHE_TTL, lambda: asyncio.gather(
+                fetch_all("""
+                    SELECT COALESCE(SUM(is_active = 1), 0),
+                           COALESCE(SUM(is_active = 0), 0),
+                           (SELECT COUNT(*) FROM download_logs)
+                    FROM files
+                """),
                 # Get top uploaders
-                async with db.execute("""
+                fetch_all("""
                     SELECT uploader_username, COUNT(*) as upload_count 
                     FROM files WHERE is_active = 1 
                     GROUP BY uploader_username 
                     ORDER BY upload_count DESC 
                     LIMIT 5
-                """) as cursor:
-                    top_uploaders = await cursor.fetchall()
-
-                # Get top downloaded files
-                async with db.execute("""
-                    SELECT f.course_code, f.lecture_number, f.note_taker, COUNT(dl.id) as download_count
-                    FROM files f
-                    LEFT JOIN download_logs dl ON f.id = dl.file_id
-                    WHERE f.is_active = 1
-                    GROUP BY f.id
+                """),
+                # Get top downloaded files (from the maintained counter, read off idx_files_active_downloads)
+                fetch_all("""
+                    SELECT course_code, lecture_number, note_taker, download_count
+                    FROM files
+                    WHERE is_active = 1
                     ORDER BY download_count DESC
                     LIMIT 5
-                """) as cursor:
-                    top_files = await cursor.fetchall()
+                """)
+            ))
+            active_files, deleted_files, total_downloads = counts[0]
 
             embed = discord.Embed(
                 title="📊 Bot Statistics",
@@ -1093,7 +1610,7 @@ class AdminCommands(commands.GroupCog, name="admin"):
             await interaction.followup.send(embed=embed)
 
         except Exception as e:
-            logger.error(f"Stats error by admin {interaction.user}: {e}")
+            logger.error("Stats error by admin %s: %s", interaction.user, e)
             await interaction.followup.send("❌ An error occurred while fetching statistics.", ephemeral=True)
 
     @app_commands.command(name="reset_stats", description="Reset download counters and clear logs (Admin only)")
@@ -1114,15 +1631,22 @@ class AdminCommands(commands.GroupCog, name="admin"):
             pass
 
         try:
-            async with aiosqlite.connect(BotConfig.DATABASE_NAME) as db:
-                # Reset counters in files table
-                await db.execute("UPDATE files SET download_count = 0, last_downloaded = NULL")
-                # Clear logs
-                await db.execute("DELETE FROM download_logs")
-                await db.execute("DELETE FROM admin_logs")
-                # Clear rate limit buckets
-                await db.execute("DELETE FROM rate_limits")
-                await db.commit()
+            async with get_db() as db:
+                # One script, one trip to the database thread: take the write lock up front
+                # so all four writes commit together (the pool rolls back if it fails midway)
+                await db.executescript("""
+                    BEGIN IMMEDIATE;
+                    -- Reset counters in files table
+                    UPDATE files SET download_count = 0, last_downloaded = NULL;
+                    -- Clear logs
+                    DELETE FROM download_logs;
+                    DELETE FROM admin_logs;
+                    -- Clear rate limit buckets
+                    DELETE FROM rate_limits;
+                    COMMIT;
+                """)
+            _result_cache.pop("stats", None)
+            _file_meta_cache.clear()
 
             await self.log_admin_action(
                 interaction.user.id,
@@ -1140,10 +1664,10 @@ class AdminCommands(commands.GroupCog, name="admin"):
             embed.set_footer(text=f"Action performed by {interaction.user.name}")
 
             await interaction.followup.send(embed=embed, ephemeral=True)
-            logger.info(f"Admin {interaction.user} reset statistics and cleared logs")
+            logger.info("Admin %s reset statistics and cleared logs", interaction.user)
 
         except Exception as e:
-            logger.error(f"Reset stats error by admin {interaction.user}: {e}")
+            logger.error("Reset stats error by admin %s: %s", interaction.user, e)
             await interaction.followup.send("❌ Failed to reset stats.", ephemeral=True)
 
 # Add admin commands to bot
@@ -1159,21 +1683,26 @@ async def setup_admin_commands():
     await bot.add_cog(AdminCommands(bot))
     # Ensure newly added group commands are registered
     try:
-        # Prefer per-guild sync for faster propagation
+        # Prefer per-guild sync for faster propagation, with all guilds synced concurrently
         if bot.guilds:
-            for guild in bot.guilds:
-                await bot.tree.sync(guild=guild)
-                logger.info(f"Synced admin commands for guild {guild.name} ({guild.id})")
+            guilds = list(bot.guilds)
+            results = await asyncio.gather(*(bot.tree.sync(guild=guild) for guild in guilds), return_exceptions=True)
+            for guild, result in zip(guilds, results):
+                if isinstance(result, Exception):
+                    logger.error("Failed to sync admin commands for guild %s (%s): %s", guild.name, guild.id, result)
+                else:
+                    logger.info("Synced admin commands for guild %s (%s)", guild.name, guild.id)
         else:
             await bot.tree.sync()
             logger.info("Synced command tree globally after registering admin commands")
     except Exception as e:
-        logger.error(f"Failed to sync command tree: {e}")
+        logger.error("Failed to sync command tree: %s", e)
 
-# Enhanced help command
-@bot.tree.command(name="help", description="Show help information")
-async def help_command(interaction: discord.Interaction):
-    # Send immediately (no defer) to avoid Unknown interaction timeouts
+# Help embeds are static apart from the admin section: built once per variant, then reused
+_help_embeds: Dict[bool, discord.Embed] = {}
+
+def build_help_embed(include_admin: bool) -> discord.Embed:
+    """Assemble the help embed, with or without the admin command section"""
     embed = discord.Embed(
         title="🤖 Ironini Ringatoni Help",
         color=discord.Color.red(),
@@ -1205,7 +1734,7 @@ async def help_command(interaction: discord.Interaction):
         inline=False
     )
 
-    if interaction.user.guild_permissions.administrator:
+    if include_admin:
         embed.add_field(
             name="🔧 Admin Commands",
             value="`/admin delete` - Delete a file\n`/admin logs` - View download logs\n`/admin stats` - View bot statistics\n`/admin reset_stats` - Clear counters and logs",
@@ -1218,6 +1747,21 @@ async def help_command(interaction: discord.Interaction):
         inline=False
     )
 
+    return embed
+
+def get_help_embed(include_admin: bool) -> discord.Embed:
+    """Return the cached help embed for this variant, building it on first use"""
+    embed = _help_embeds.get(include_admin)
+    if embed is None:
+        embed = _help_embeds[include_admin] = build_help_embed(include_admin)
+    return embed
+
+# Enhanced help command
+@bot.tree.command(name="help", description="Show help information")
+async def help_command(interaction: discord.Interaction):
+    # Send immediately (no defer) to avoid Unknown interaction timeouts
+    embed = get_help_embed(interaction.user.guild_permissions.administrator)
+
     try:
         await interaction.response.send_message(embed=embed, ephemeral=True)
     except Exception:
@@ -1227,14 +1771,27 @@ async def help_command(interaction: discord.Interaction):
             pass
 
 # ===== Migrated fun/utility commands (slash versions) =====
+# Per-request timeout for the public quote/advice APIs (the shared session allows 120s for attachments)
+FUN_API_TIMEOUT = aiohttp.ClientTimeout(total=10)
+
+# Recent API responses, replayed during bursts so repeated calls skip the network
+advice_ring = ResponseRing()
+kanye_ring = ResponseRing()
+
+async def fetch_json(url: str) -> Optional[dict]:
+    """GET a JSON API through the shared session, returning None on a non-200 response"""
+    async with bot.http_session.get(url, timeout=FUN_API_TIMEOUT) as resp:
+        if resp.status != 200:
+            return None
+        # adviceslip serves its JSON as text/html, so skip the content-type check
+        return await resp.json(content_type=None)
+
 @bot.tree.command(name="advice", description="Get a random piece of advice")
 async def advice_cmd(interaction: discord.Interaction):
     await interaction.response.defer()
-    import requests
     try:
-        resp = requests.get("https://api.adviceslip.com/advice", timeout=10)
-        if resp.status_code == 200:
-            data = resp.json()
+        data = await advice_ring.get(lambda: fetch_json("https://api.adviceslip.com/advice"))
+        if data is not None:
             advice = data.get("slip", {}).get("advice", "No advice found.")
             await interaction.followup.send(f"🤓 Advice: {advice}")
         else:
@@ -1245,11 +1802,9 @@ async def advice_cmd(interaction: discord.Interaction):
 @bot.tree.command(name="kanye", description="Get a random Kanye West quote")
 async def kanye_cmd(interaction: discord.Interaction):
     await interaction.response.defer()
-    import requests
     try:
-        resp = requests.get("https://api.kanye.rest/", timeout=10)
-        if resp.status_code == 200:
-            data = resp.json()
+        data = await kanye_ring.get(lambda: fetch_json("https://api.kanye.rest/"))
+        if data is not None:
             quote = data.get("quote", "No quote found.")
             embed = discord.Embed(
                 title="Kanye West Quote",
@@ -1286,28 +1841,48 @@ async def activatefreakmode_cmd(interaction: discord.Interaction):
 
 
 
+# Parsed courses.json, keyed by casefolded course code; loaded on first /course call
+_courses: Optional[Dict[str, dict]] = None
+
+def get_courses() -> Dict[str, dict]:
+    """Load courses.json once and reuse it for every /course lookup"""
+    global _courses
+    if _courses is None:
+        with open('courses.json', 'r') as f:
+            _courses = {code.casefold(): course for code, course in json.load(f).items()}
+    return _courses
+
+# Built /course embeds, keyed like _courses; course data doesn't change while the bot runs
+_course_embeds: Dict[str, discord.Embed] = {}
+
+def get_course_embed(course_code: str) -> Optional[discord.Embed]:
+    """Return the embed for a course, building it on first lookup, or None if the course is unknown"""
+    key = course_code.casefold()
+    embed = _course_embeds.get(key)
+    if embed is None:
+        course = get_courses().get(key)
+        if course is None:
+            return None
+        embed = discord.Embed(
+            title=f"{key.upper()}: {course['name']}",
+            color=discord.Color.blue()
+        )
+        embed.add_field(name="Year", value=course.get('year', '-'), inline=False)
+        embed.add_field(name="Rating", value=course.get('review', '-'), inline=False)
+        embed.add_field(name="Notes", value=course.get('notes', '-'), inline=False)
+        _course_embeds[key] = embed
+    return embed
+
 @bot.tree.command(name="course", description="Show info about an engineering course")
 @app_commands.describe(course_code="Course code (e.g., ECOR1048)")
 async def course_cmd(interaction: discord.Interaction, course_code: str):
     await interaction.response.defer()
     try:
-        # Load JSON data from local file
-        with open('courses.json', 'r') as f:
-            courses = json.load(f)
-
-        key = course_code.lower()
-        if key not in courses:
+        embed = get_course_embed(course_code)
+        if embed is None:
             await interaction.followup.send("Course not found (or not added yet).")
             return
 
-        course = courses[key]
-        embed = discord.Embed(
-            title=f"{course_code.upper()}: {course['name']}",
-            color=discord.Color.blue()
-        )
-        embed.add_field(name="Year", value=course.get('year', '-'), inline=False)
-        embed.add_field(name="Rating", value=course.get('review', '-'), inline=False)
-        embed.add_field(name="Notes", value=course.get('notes', '-'), inline=False)
         await interaction.followup.send(embed=embed)
     except Exception:
         await interaction.followup.send("Failed to load course info. Please try again later.")
@@ -1322,43 +1897,49 @@ async def on_ready():
     try:
         await hard_resync_commands()
     except Exception as e:
-        logger.error(f"Hard resync failed: {e}")
+        logger.error("Hard resync failed: %s", e)
     # Log registered command names to verify presence of help/admin/etc.
     try:
         command_names = [cmd.name for cmd in bot.tree.get_commands()]
-        logger.info(f"Registered global commands: {command_names}")
+        logger.info("Registered global commands: %s", command_names)
         for guild in bot.guilds:
             guild_cmds = [cmd.name for cmd in bot.tree.get_commands(guild=guild)]
-            logger.info(f"Registered commands for guild {guild.name} ({guild.id}): {guild_cmds}")
+            logger.info("Registered commands for guild %s (%s): %s", guild.name, guild.id, guild_cmds)
     except Exception as e:
-        logger.error(f"Failed listing registered commands: {e}")
-    logger.info(f"Bot ready: {bot.user} in {len(bot.guilds)} guilds")
+        logger.error("Failed listing registered commands: %s", e)
+    logger.info("Bot ready: %s in %d guilds", bot.user, len(bot.guilds))
 
 async def hard_resync_commands():
     """Clear and re-sync app commands globally and per-guild.
     This helps when command definitions changed or permissions/groups didn't propagate.
     """
-    # Do NOT clear local tree; just sync to Discord so decorated commands register
-    try:
-        synced = await bot.tree.sync()
-        logger.info(f"Hard resync: synced {len(synced)} global command(s)")
-    except Exception as e:
-        logger.error(f"Hard resync (global) failed: {e}")
+    # Do NOT clear local tree; just sync to Discord so decorated commands register.
+    # The global and per-guild syncs are independent requests, so they run concurrently.
+    guilds = list(bot.guilds)
+    synced, *guild_results = await asyncio.gather(
+        bot.tree.sync(),
+        *(bot.tree.sync(guild=guild) for guild in guilds),
+        return_exceptions=True
+    )
 
-    for guild in bot.guilds:
-        try:
-            synced_guild = await bot.tree.sync(guild=guild)
-            logger.info(f"Hard resync: synced {len(synced_guild)} command(s) for guild {guild.name} ({guild.id})")
-        except Exception as e:
-            logger.error(f"Hard resync failed for guild {guild.name} ({guild.id}): {e}")
+    if isinstance(synced, Exception):
+        logger.error("Hard resync (global) failed: %s", synced)
+    else:
+        logger.info("Hard resync: synced %d global command(s)", len(synced))
+
+    for guild, synced_guild in zip(guilds, guild_results):
+        if isinstance(synced_guild, Exception):
+            logger.error("Hard resync failed for guild %s (%s): %s", guild.name, guild.id, synced_guild)
+        else:
+            logger.info("Hard resync: synced %d command(s) for guild %s (%s)", len(synced_guild), guild.name, guild.id)
 
 @bot.event
 async def on_command_error(ctx, error):
-    logger.error(f"Command error in {ctx.guild}: {error}")
+    logger.error("Command error in %s: %s", ctx.guild, error)
 
 @bot.event
 async def on_app_command_error(interaction: discord.Interaction, error: app_commands.AppCommandError):
-    logger.error(f"Slash command error: {error}")
+    logger.error("Slash command error: %s", error)
     if not interaction.response.is_done():
         await interaction.response.send_message("❌ An unexpected error occurred.", ephemeral=True)
 
@@ -1367,6 +1948,6 @@ if __name__ == "__main__":
     try:
         bot.run(BotConfig.TOKEN)
     except Exception as e:
-        logger.critical(f"Failed to start bot: {e}")
+        logger.critical("Failed to start bot: %s", e)
         print(f"❌ Failed to start bot: {e}")
         print("Please check your configuration and token.")
\ No newline at end of file
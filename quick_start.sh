@@ -7,7 +7,7 @@ echo "=========================================="
 echo "🐍 Checking Python version..."
 python3 --version
 if [ $? -ne 0 ]; then
-    echo "❌ Python 3 not found. Please install Python 3.8+ first."
+    echo "❌ Python 3 not found. Please install Python 3.9+ first."
     exit 1
 fi
 
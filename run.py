@@ -6,12 +6,14 @@ Simple launcher with error handling
 
 import sys
 import os
-from pathlib import Path
 
 def check_setup():
     """Check if bot is properly set up"""
-    required_files = ['.env', 'discord_note_bot.py', 'config.py']
-    missing = [f for f in required_files if not Path(f).exists()]
+    required_files = ['.env', 'discord_note_bot.py', 'config.py', 'watermark.py']
+    # One directory listing instead of a stat per file
+    with os.scandir('.') as entries:
+        present = {entry.name for entry in entries}
+    missing = [f for f in required_files if f not in present]
 
     if missing:
         print("❌ Setup incomplete!")
@@ -21,23 +21,34 @@ def print_banner():
 def check_python_version():
     """Check if Python version is compatible"""
     print("🐍 Checking Python version...")
-    if sys.version_info < (3, 8):
-        print("❌ Python 3.8 or higher is required!")
+    if sys.version_info < (3, 9):
+        print("❌ Python 3.9 or higher is required!")
         print(f"   Current version: {sys.version}")
         return False
     print(f"✅ Python {sys.version_info.major}.{sys.version_info.minor} is compatible")
     return True
 
-def install_dependencies():
-    """Install required Python packages"""
-    print("📦 Installing dependencies...")
-    try:
-        subprocess.check_call([sys.executable, "-m", "pip", "install", "-r", "requirements.txt"])
-        print("✅ Dependencies installed successfully")
-        return True
-    except subprocess.CalledProcessError as e:
-        print(f"❌ Failed to install dependencies: {e}")
+def start_dependency_install():
+    """Start installing required Python packages in the background"""
+    print("📦 Installing dependencies in the background...")
+    # Output is collected rather than streamed so it doesn't interleave with the setup prompts
+    return subprocess.Popen(
+        [sys.executable, "-m", "pip", "install", "-r", "requirements.txt"],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        text=True
+    )
+
+def install_dependencies(process):
+    """Wait for the background package install to finish"""
+    print("📦 Waiting for dependency installation...")
+    output, _ = process.communicate()
+    if process.returncode != 0:
+        print(output)
+        print(f"❌ Failed to install dependencies: pip exited with status {process.returncode}")
         return False
+    print("✅ Dependencies installed successfully")
+    return True
 
 def create_directories():
     """Create necessary directories"""
@@ -49,6 +60,7 @@ def create_directories():
         print(f"   ✓ Created {directory}/")
 
     print("✅ Directories created")
+    return True
 
 def setup_environment():
     """Setup environment variables"""
@@ -121,13 +133,18 @@ def verify_files():
     required_files = [
         'discord_note_bot.py',
         'config.py',
+        'watermark.py',
         'requirements.txt',
         '.env'
     ]
 
+    # One directory listing instead of a stat per file
+    with os.scandir('.') as entries:
+        present = {entry.name for entry in entries}
+
     missing_files = []
     for file in required_files:
-        if not Path(file).exists():
+        if file not in present:
             missing_files.append(file)
         else:
             print(f"   ✓ {file}")
@@ -183,19 +200,29 @@ def main():
     """Main setup process"""
     print_banner()
 
+    print("\nChecking Python version...")
+    if not check_python_version():
+        print("\n❌ Setup failed at: Checking Python version")
+        print("Please resolve the issue and run setup again.")
+        sys.exit(1)
+
+    # pip is the slow step and needs no input, so it runs while the other steps proceed
+    pip_process = start_dependency_install()
+
     # Step-by-step setup
     steps = [
-        ("Checking Python version", check_python_version),
-        ("Installing dependencies", install_dependencies),
         ("Creating directories", create_directories),
         ("Setting up environment", setup_environment),
         ("Testing database", test_database),
-        ("Verifying files", verify_files)
+        ("Verifying files", verify_files),
+        ("Installing dependencies", lambda: install_dependencies(pip_process))
     ]
 
     for step_name, step_func in steps:
         print(f"\n{step_name}...")
         if not step_func():
+            if pip_process.poll() is None:
+                pip_process.terminate()
             print(f"\n❌ Setup failed at: {step_name}")
             print("Please resolve the issue and run setup again.")
             sys.exit(1)
@@ -0,0 +1,201 @@
+"""PDF watermarking, kept in its own module so it can run in worker processes"""
+import io
+import os
+import math
+import hashlib
+import logging
+from datetime import datetime
+from collections import OrderedDict
+from typing import Dict, List, Tuple
+
+import pikepdf
+from reportlab.pdfgen import canvas
+from reportlab.lib.colors import Color
+
+from config import BotConfig
+
+logger = logging.getLogger(__name__)
+
+# Size of the bot's watermark ProcessPoolExecutor; each worker keeps its own source cache
+WATERMARK_WORKERS = os.cpu_count() or 1
+
+# Per-process LRU of source PDFs: (path, size, mtime) -> (page sizes, raw bytes).
+# Uploaded notes never change in place, and the key changes if a file is replaced.
+# CACHE_SIZE_MB is split between the WATERMARK_WORKERS processes, so it bounds their combined memory.
+SourceKey = Tuple[str, int, float]
+_source_cache: "OrderedDict[SourceKey, Tuple[Tuple[Tuple[float, float], ...], bytes]]" = OrderedDict()
+_source_cache_bytes = 0
+_SOURCE_CACHE_MAX_ENTRIES = 64
+
+def _cache_source_pdf(key: SourceKey, page_sizes: Tuple[Tuple[float, float], ...], raw: bytes):
+    """Remember a source PDF, evicting least recently used entries past this worker's share of CACHE_SIZE_MB"""
+    global _source_cache_bytes
+    budget = BotConfig.CACHE_SIZE_MB * 1024 * 1024 // WATERMARK_WORKERS
+    if len(raw) > budget:
+        return
+    _source_cache[key] = (page_sizes, raw)
+    _source_cache_bytes += len(raw)
+    while len(_source_cache) > _SOURCE_CACHE_MAX_ENTRIES or _source_cache_bytes > budget:
+        _, (_, evicted) = _source_cache.popitem(last=False)
+        _source_cache_bytes -= len(evicted)
+
+def generate_watermark_pdf(text: str, page_width: float, page_height: float, download_id: str = None) -> io.BytesIO:
+    """Generate an enhanced watermark PDF with multiple security layers"""
+    packet = io.BytesIO()
+
+    # Create canvas
+    c = canvas.Canvas(packet, pagesize=(page_width, page_height))
+
+    # Read watermark settings from config once
+    watermark_color = BotConfig.get_watermark_color()
+    opacity = BotConfig.WATERMARK_OPACITY
+    font_size = BotConfig.WATERMARK_FONT_SIZE
+    small_font_size = BotConfig.WATERMARK_SMALL_FONT_SIZE
+
+    # Set transparency
+    c.setFillAlpha(opacity)
+
+    # Set font for diagonal watermark
+    c.setFont("Helvetica-Bold", font_size)
+
+    # Calculate diagonal angle and position
+    diagonal_angle = math.atan2(page_height, page_width) * 180 / math.pi
+
+    # Multiple watermarks across the page (enhanced grid)
+    step_x = page_width / 4  # More dense coverage
+    step_y = page_height / 5
+
+    # Fill color and text variations are the same for every grid cell
+    fill_color = Color(watermark_color[0], watermark_color[1], watermark_color[2], alpha=opacity)
+    watermark_texts = [
+        text,
+        f"{text} - {datetime.now().strftime('%Y%m%d')}",
+        f"Downloaded: {text}"
+    ]
+
+    # Each text line's offset from its cell centre in the rotated frame, centred like drawCentredString
+    line_offsets = [
+        (-c.stringWidth(wm_text, "Helvetica-Bold", font_size) / 2, 10 + (i * 15), wm_text)
+        for i, wm_text in enumerate(watermark_texts)
+    ]
+    cell_centres = [
+        (x_offset + step_x/2, y_offset + step_y/2)
+        for x_offset in range(0, int(page_width), int(step_x))
+        for y_offset in range(0, int(page_height), int(step_y))
+    ]
+    cos_a = math.cos(math.radians(diagonal_angle))
+    sin_a = math.sin(math.radians(diagonal_angle))
+
+    # Draw the whole grid as one text object, placing each line with a rotated text matrix
+    c.saveState()
+    c.setFillColor(fill_color)
+    text_object = c.beginText()
+    for cx, cy in cell_centres:
+        for dx, dy, wm_text in line_offsets:
+            text_object.setTextTransform(
+                cos_a, sin_a, -sin_a, cos_a,
+                cx + dx * cos_a - dy * sin_a,
+                cy + dx * sin_a + dy * cos_a
+            )
+            text_object.textOut(wm_text)
+    c.drawText(text_object)
+    c.restoreState()
+
+    # Add corner watermarks with enhanced information
+    c.saveState()
+    c.setFont("Helvetica", small_font_size)
+    c.setFillAlpha(0.6)
+    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+    # Bottom left corner
+    c.drawString(30, 30, f"Downloaded by: {text}")
+    c.drawString(30, 15, f"Date: {timestamp}")
+
+    # Top right corner (if there's space)
+    if page_width > 200:
+        c.drawString(page_width - 200, page_height - 20, f"ID: {download_id[:8] if download_id else 'N/A'}")
+
+    # Add invisible watermark for tamper detection
+    if download_id:
+        c.setFillAlpha(0.1)  # Very transparent
+        c.setFont("Helvetica", 8)
+        c.drawString(page_width - 100, 10, f"SEC:{hashlib.md5(download_id.encode()).hexdigest()[:8]}")
+
+    c.restoreState()
+
+    c.save()
+    packet.seek(0)
+    return packet
+
+def warm_up_worker():
+    """Pool initializer: render and parse one watermark so each worker pays its import and font setup cost up front"""
+    with pikepdf.Pdf.open(generate_watermark_pdf("warm-up", 612, 792)):
+        pass
+
+def watermark_pdf_file(original_pdf_path: str, downloader_username: str, output_path: str):
+    """Apply watermark to all pages of a PDF and write the result to output_path
+
+    Runs in a worker process; the output goes straight to disk so the PDF
+    never has to be pickled back to the bot process.
+    """
+    try:
+        # Reuse the raw bytes and page sizes of recently downloaded notes
+        stat = os.stat(original_pdf_path)
+        source_key = (original_pdf_path, stat.st_size, stat.st_mtime)
+        cached = _source_cache.get(source_key)
+        if cached is not None:
+            _source_cache.move_to_end(source_key)
+            cached_sizes, raw = cached
+        else:
+            with open(original_pdf_path, 'rb') as file:
+                raw = file.read()
+            cached_sizes = None
+
+        # Open original PDF (qpdf does the parsing and stream copying natively)
+        with pikepdf.Pdf.open(io.BytesIO(raw)) as pdf:
+            total_pages = len(pdf.pages)
+            logger.info("Applying watermark to %s pages for user %s", total_pages, downloader_username)
+            page_sizes: List[Tuple[float, float]] = []
+
+            # One rendered watermark per distinct page size (usually just one per PDF);
+            # the overlay documents must stay open until the output is saved
+            overlay_cache: Dict[Tuple[float, float], pikepdf.Page] = {}
+            overlay_pdfs = []
+
+            try:
+                for page_num, page in enumerate(pdf.pages):
+                    # Get page dimensions
+                    if cached_sizes is not None:
+                        page_width, page_height = cached_sizes[page_num]
+                    else:
+                        mediabox = pikepdf.Rectangle(page.mediabox)
+                        page_width, page_height = float(mediabox.width), float(mediabox.height)
+                        page_sizes.append((page_width, page_height))
+
+                    size_key = (round(page_width, 1), round(page_height, 1))
+                    watermark_page = overlay_cache.get(size_key)
+                    if watermark_page is None:
+                        # Generate watermark for this page size
+                        watermark_packet = generate_watermark_pdf(
+                            downloader_username, page_width, page_height
+                        )
+                        watermark_pdf = pikepdf.Pdf.open(watermark_packet)
+                        overlay_pdfs.append(watermark_pdf)
+                        watermark_page = watermark_pdf.pages[0]
+                        overlay_cache[size_key] = watermark_page
+
+                    # Stamp watermark on top of the original page content
+                    page.add_overlay(watermark_page)
+
+                # Write the watermarked copy to disk
+                pdf.save(output_path, linearize=False, compress_streams=True)
+
+                if cached_sizes is None:
+                    _cache_source_pdf(source_key, tuple(page_sizes), raw)
+            finally:
+                for watermark_pdf in overlay_pdfs:
+                    watermark_pdf.close()
+
+    except Exception as e:
+        logger.error("Error applying watermark: %s", e)
+        raise